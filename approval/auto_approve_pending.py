@@ -5,51 +5,79 @@ Triggered daily by EventBridge.
 """
 
 import os, boto3, datetime
+from concurrent.futures import ThreadPoolExecutor
 from boto3.dynamodb.conditions import Key, Attr
+from botocore.config import Config
 from botocore.exceptions import ClientError          # ← NEW
 
 REGION = os.environ["AWS_REGION"]                    # auto-injected by Lambda
 TABLE  = os.environ["DYNAMODB_ENRICHMENT_TABLE"]
 
-ddb = boto3.resource("dynamodb", region_name=REGION).Table(TABLE)
-NOW     = datetime.datetime.utcnow()
-CUTOFF  = NOW - datetime.timedelta(days=7)           # 7-day rule
+WORKERS = 16                                         # concurrent UpdateItem calls
+
+# keep-alive pool as deep as the update workers
+CFG = Config(tcp_keepalive=True, max_pool_connections=WORKERS,
+             retries={"max_attempts": 3, "mode": "adaptive"})
+ddb = boto3.resource("dynamodb", region_name=REGION, config=CFG).Table(TABLE)
+MAX_AGE = datetime.timedelta(days=7)                 # 7-day rule
+
+FIELDS  = "project_id, card_id, sent_timestamp"       # all the handler reads
+UPDATE_EXPR = ("SET approval_status = :s, "
+               "approval_timestamp = :ts, "
+               "approval_comment  = :c")
+
+def _paged(op, **kw):
+    """Yield items from every page of a Table query/scan."""
+    while True:
+        resp = op(**kw)
+        yield from resp.get("Items", [])
+        if "LastEvaluatedKey" not in resp:
+            return
+        kw["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
 
 def _pending_items() -> list[dict]:
-    """Query GSI if present, else full scan."""
+    """Query GSI if present, else full scan (projected + paginated)."""
     try:
-        return ddb.query(
-            IndexName="approval_status-index",
-            KeyConditionExpression=Key("approval_status").eq("pending")
-        ).get("Items", [])
+        return list(_paged(ddb.query,
+                           IndexName="approval_status-index",
+                           KeyConditionExpression=Key("approval_status").eq("pending"),
+                           ProjectionExpression=FIELDS))
     except ClientError as e:
         if e.response["Error"]["Code"] != "ValidationException":
             raise                                              # genuine failure
         # GSI missing → fall back to scan
-        return ddb.scan(
-            FilterExpression=Attr("approval_status").eq("pending")
-        ).get("Items", [])
+        return list(_paged(ddb.scan,
+                           FilterExpression=Attr("approval_status").eq("pending"),
+                           ProjectionExpression=FIELDS))
 
 def lambda_handler(event, _ctx):
+    now    = datetime.datetime.utcnow()               # per run, not per container
+    cutoff = now - MAX_AGE
+    values = {                                        # identical for every row
+        ":s":  {"S": "auto-approved"},
+        ":ts": {"S": now.isoformat() + "Z"},
+        ":c":  {"S": "Automatically approved after 7 days"}
+    }
     items = _pending_items()
-    auto_count = 0
+    keys  = []
     for row in items:
         ts = row.get("sent_timestamp")
         if not ts:
             continue
         sent_dt = datetime.datetime.fromisoformat(ts.rstrip("Z"))
-        if sent_dt <= CUTOFF:
-            ddb.update_item(
-                Key={"project_id": row["project_id"], "card_id": row["card_id"]},
-                UpdateExpression=("SET approval_status = :s, "
-                                  "approval_timestamp = :ts, "
-                                  "approval_comment  = :c"),
-                ExpressionAttributeValues={
-                    ":s": "auto-approved",
-                    ":ts": NOW.isoformat() + "Z",
-                    ":c": "Automatically approved after 7 days"
-                }
-            )
-            auto_count += 1
+        if sent_dt <= cutoff:
+            keys.append({"project_id": {"S": row["project_id"]},
+                         "card_id":    {"S": row["card_id"]}})
+
+    # low-level client (thread-safe) → the UpdateItem round-trips overlap
+    client = ddb.meta.client
+    def _approve(key):
+        client.update_item(TableName=TABLE, Key=key,
+                           UpdateExpression=UPDATE_EXPR,
+                           ExpressionAttributeValues=values,
+                           ReturnValues="NONE")
+    with ThreadPoolExecutor(max_workers=WORKERS) as pool:
+        list(pool.map(_approve, keys))
+    auto_count = len(keys)
 
     return {"statusCode": 200, "body": f"{auto_count} records auto-approved"}
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Shared ProjectPlace helpers for the metadata enrichers   v1.0
+
+• One pooled urllib3 connection manager (keep-alive, 429/5xx retries)
+• OAuth token + Secrets Manager payload cached across warm starts
+• /members map cached per project
+• orjson when bundled, stdlib json otherwise
+• to_av(): Python value → DynamoDB AttributeValue (no TypeSerializer)
+Zipped next to project_metadata_enricher*.py by the deploy scripts/workflows.
+"""
+
+import os, json, time, math, functools, boto3, urllib3
+from botocore.config import Config
+from decimal import Decimal, InvalidOperation
+from typing import Any, Dict
+from urllib import parse
+
+try:                                    # bundled by the deploy script; stdlib otherwise
+    from orjson import loads
+except ImportError:
+    loads = json.loads
+
+API_BASE_URL = "https://api.projectplace.com"
+
+AWS_CFG = Config(tcp_keepalive=True, max_pool_connections=50,
+                 retries={"mode": "adaptive", "max_attempts": 10})
+
+# pooled keep-alive connections to ProjectPlace (urllib3 ships with botocore)
+HTTP = urllib3.PoolManager(
+    maxsize=32, timeout=urllib3.Timeout(connect=5, read=30),
+    retries=urllib3.Retry(total=5, backoff_factor=0.2, raise_on_status=False,
+                          status_forcelist=(429, 500, 502, 503, 504)))
+
+
+@functools.lru_cache(maxsize=1)
+def _secrets():
+    return boto3.client("secretsmanager", region_name=os.environ["AWS_REGION"], config=AWS_CFG)
+
+
+# ─── HTTP ────────────────────────────────────────────────────────────────────
+def read_json(resp) -> Any:
+    if resp.status >= 400:
+        raise RuntimeError(f"HTTP {resp.status}: {resp.data.decode(errors='replace')}")
+    return loads(resp.data)
+
+
+def auth_headers(token: str) -> Dict[str, str]:
+    # gzip: card lists compress 5-10×; urllib3 decodes the body transparently
+    return {"Authorization": f"Bearer {token}", "Accept-Encoding": "gzip"}
+
+
+def get_json(url: str, token: str) -> Any:
+    return read_json(HTTP.request("GET", url, headers=auth_headers(token)))
+
+
+# ─── OAuth ───────────────────────────────────────────────────────────────────
+_SECRET: Dict[str, str] = {}            # parsed secret, kept for warm starts
+_TOKEN  = {"token": None, "exp": 0.0}   # bearer token + expiry (epoch s)
+
+
+def get_token(secret_name: str) -> str:
+    if _TOKEN["token"] and time.time() < _TOKEN["exp"]:
+        return _TOKEN["token"]
+    if not _SECRET:
+        _SECRET.update(json.loads(_secrets().get_secret_value(SecretId=secret_name)["SecretString"]))
+    data = parse.urlencode({
+        "grant_type":    "client_credentials",
+        "client_id":     _SECRET["PROJECTPLACE_ROBOT_CLIENT_ID"],
+        "client_secret": _SECRET["PROJECTPLACE_ROBOT_CLIENT_SECRET"],
+    }).encode()
+    body = read_json(HTTP.request(
+        "POST", f"{API_BASE_URL}/oauth2/access_token", body=data,
+        headers={"Content-Type": "application/x-www-form-urlencoded"}))
+    _TOKEN["token"] = body["access_token"]
+    _TOKEN["exp"]   = time.time() + int(body.get("expires_in", 0)) - 60   # no expires_in → never reused
+    return _TOKEN["token"]
+
+
+# ─── members ─────────────────────────────────────────────────────────────────
+_CTX = {"token": None}      # bearer token for _members_of (kept out of the cache key)
+
+
+@functools.lru_cache(maxsize=4096)
+def _members_of(project_id: str, _bucket: int) -> Dict[str, tuple]:
+    url = f"{API_BASE_URL}/1/projects/{project_id}/members"
+    return {str(m.get("id")): (m.get("email", ""), m.get("name", ""))
+            for m in get_json(url, _CTX["token"])}
+
+
+def get_members(project_id: str, token: str, ttl: int = 0,
+                raise_errors: bool = False) -> Dict[str, tuple]:
+    """member-id → (email, name); one /members call per project (per ttl s if ttl > 0).
+    Returns {} if /members fails (raises instead with raise_errors) — failures are not cached."""
+    _CTX["token"] = token
+    try:
+        return _members_of(str(project_id), int(time.time() // ttl) if ttl else 0)
+    except RuntimeError as e:
+        if raise_errors:
+            raise
+        print("⚠️ member fetch failed:", e)
+    return {}
+
+
+def pm_lookup(members: Dict[str, tuple]):
+    """creator-id → (email, name), memoised on the raw id: a project has few creators,
+    so str() + the members lookup run once per creator instead of once per card."""
+    memo: Dict[Any, tuple] = {}
+
+    def pm_of(creator_id: Any) -> tuple:
+        hit = memo.get(creator_id)
+        if hit is None:
+            hit = memo[creator_id] = members.get(str(creator_id), ("", ""))
+        return hit
+    return pm_of
+
+
+# ─── DynamoDB ────────────────────────────────────────────────────────────────
+# Python value → DynamoDB AttributeValue (replaces Decimal conversion + TypeSerializer)
+def to_av(val: Any) -> Dict[str, Any]:
+    if val is None:
+        return {"NULL": True}
+    if isinstance(val, bool):               # before int: bool is an int subclass
+        return {"BOOL": val}
+    if isinstance(val, str):
+        return {"S": val}
+    if isinstance(val, (int, Decimal)):
+        return {"N": str(val)}
+    if isinstance(val, float):
+        if math.isfinite(val) and abs(val) < 1e38:
+            try:
+                return {"N": str(Decimal(str(val)))}
+            except (InvalidOperation, OverflowError):
+                pass
+        return {"S": str(val)}              # huge / inf / nan
+    if isinstance(val, (list, tuple)):
+        return {"L": [to_av(v) for v in val]}
+    if isinstance(val, dict):
+        return {"M": {str(k): to_av(v) for k, v in val.items()}}
+    return {"S": str(val)}
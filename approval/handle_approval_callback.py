@@ -8,14 +8,19 @@ Writes approval_status + timestamp (+ optional comment) and
 returns branded HTML page.
 """
 
-import os, json, datetime, urllib.parse, boto3
-from boto3.dynamodb.conditions import Key, Attr
+import os, datetime, urllib.parse, boto3
+from boto3.dynamodb.conditions import Key
+from botocore.config import Config
 from botocore.exceptions import ClientError
 
-REGION      = os.getenv("AWS_REGION", boto3.Session().region_name)
+REGION      = os.getenv("AWS_REGION") or os.getenv("AWS_DEFAULT_REGION") \
+              or boto3.Session().region_name       # Session only off-Lambda
 TABLE_NAME  = os.getenv("DYNAMODB_ENRICHMENT_TABLE") or os.getenv("DYNAMODB_TABLE_NAME")
 
-ddb   = boto3.resource("dynamodb", region_name=REGION)
+# keep-alive: warm invocations reuse the TLS connection to DynamoDB
+CFG   = Config(tcp_keepalive=True, max_pool_connections=10,
+               retries={"max_attempts": 3, "mode": "adaptive"})
+ddb   = boto3.resource("dynamodb", region_name=REGION, config=CFG)
 table = ddb.Table(TABLE_NAME)
 
 BRAND_COLOR = "#4AC795"
@@ -40,12 +45,7 @@ def lambda_handler(event, context):
 
     # ── 1. Find record by approval_token ───────────────────────────
     try:
-        if _gsi_exists():
-            resp  = table.query(IndexName="approval_token-index",
-                                KeyConditionExpression=Key("approval_token").eq(token))
-            items = resp.get("Items", [])
-        else:
-            items = table.scan(FilterExpression=Attr("approval_token").eq(token)).get("Items", [])
+        items = _find_token(token)
     except ClientError as e:
         return _html(500, "Database error", e.response["Error"]["Message"])
 
@@ -67,7 +67,8 @@ def lambda_handler(event, context):
 
     table.update_item(Key=pk,
                       UpdateExpression=update_expr,
-                      ExpressionAttributeValues=expr_values)
+                      ExpressionAttributeValues=expr_values,
+                      ReturnValues="NONE")          # nothing read back
 
     # ── 3. Build confirmation HTML ────────────────────────────────
     msg = "The Acta has been successfully marked as <b>{}</b>.".format(status.upper())
@@ -77,10 +78,28 @@ def lambda_handler(event, context):
     return _html(200, "Thank you for your response", msg)
 
 # ─── helpers ───────────────────────────────────────────────────────────
-def _gsi_exists() -> bool:
-    meta = table.meta.client.describe_table(TableName=TABLE_NAME)
-    gsis = meta["Table"].get("GlobalSecondaryIndexes", [])
-    return any(g["IndexName"] == "approval_token-index" for g in gsis)
+def _find_token(token: str) -> list:
+    """Query the GSI directly (no DescribeTable round-trip); scan only if it is missing."""
+    try:
+        resp = table.query(IndexName="approval_token-index",
+                           KeyConditionExpression=Key("approval_token").eq(token))
+        return resp.get("Items", [])
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "ValidationException":
+            raise                              # genuine failure
+    return _scan_for_token(token)             # GSI missing
+
+def _scan_for_token(token: str) -> list:
+    """Paginated scan fallback; stops at the first page holding a match."""
+    pages = table.meta.client.get_paginator("scan").paginate(
+        TableName=TABLE_NAME,
+        FilterExpression="approval_token = :t",
+        ExpressionAttributeValues={":t": {"S": token}},
+        ProjectionExpression="project_id, card_id")
+    for page in pages:                         # raw {"S": …} values, no deserializer
+        for it in page["Items"]:
+            return [{"project_id": it["project_id"]["S"], "card_id": it["card_id"]["S"]}]
+    return []
 
 def _html(code: int, title: str, msg: str):
     return {
@@ -3,195 +3,289 @@
 ProjectPlace → DynamoDB enrichment Lambda   v3.0  (2025-05-11)
 
 • Pulls every card for every project present in table v2
-• Stores extended card fields + full comments array
-• Converts floats → Decimal, or string if > 1e38 / ±Inf / NaN
+• Stores extended card fields + comments array (≤ COMMENTS_LIMIT, default 50)
+• Serialises straight to AttributeValues; floats > 1e38 / ±Inf / NaN → string
 • Aliases reserved word  #project
-• Uses paginated scan so no project is skipped
+• SETs only non-empty attributes; None / "" ones are REMOVEd
+• Uses a parallel segmented scan (paginated per segment) so no project is skipped
+• Projects and their comment fetches run concurrently (bounded API slots)
+• Cards whose content_hash is unchanged are not rewritten (FORCE_REFRESH=1 overrides)
+• Token / members / JSON helpers shared with the by-id enricher (enricher_core.py)
 • No external libraries (Python 3.9 stock)
 """
 
-import json, os, re, time, random, math, urllib.error
-from decimal import Decimal, InvalidOperation
+import json, os, re, time, random, functools, threading, hashlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing  import Any, Dict, Optional
-from urllib  import request, parse
-import boto3
-from boto3.dynamodb.conditions import Key           # ← **ADD THIS**
+import boto3, urllib3
+from botocore.config import Config
+from enricher_core import loads as _loads, HTTP, get_token, get_members, pm_lookup, to_av
 
 # ─────────── ENV / CLIENTS ──────────────────────────────────────────
-REGION      = os.getenv("AWS_REGION", boto3.Session().region_name)
+REGION      = os.getenv("AWS_REGION") or os.getenv("AWS_DEFAULT_REGION") \
+              or boto3.Session().region_name       # Session only off-Lambda
 TABLE_NAME  = os.environ["DYNAMODB_ENRICHMENT_TABLE"].strip()
 API_BASE    = "https://api.projectplace.com"
 SECRET_NAME = os.getenv("PROJECTPLACE_SECRET_NAME",
                          "ProjectPlaceAPICredentials")
 DRY_RUN     = os.getenv("DRY_RUN", "0") == "1"
+MEMBERS_TTL = int(os.getenv("MEMBERS_TTL", "300"))     # seconds, survives warm starts
+COMMENTS_LIMIT = int(os.getenv("COMMENTS_LIMIT", "50"))  # 0 → no ?limit=
+ENRICH_CONCURRENCY = int(os.getenv("ENRICH_CONCURRENCY", "8"))   # projects in flight
+API_CONCURRENCY    = int(os.getenv("API_CONCURRENCY", "16"))     # ProjectPlace calls in flight
+PP_RATE            = float(os.getenv("PP_RATE", "0"))            # ProjectPlace quota, req/s (0 = off)
+WRITE_CONCURRENCY  = int(os.getenv("WRITE_CONCURRENCY", "16"))   # UpdateItem calls in flight
+FORCE_REFRESH      = os.getenv("FORCE_REFRESH", "0") == "1"      # rewrite even unchanged cards
+SCAN_SEGMENTS      = int(os.getenv("SCAN_SEGMENTS", "4"))        # parallel scan workers
 
-dynamodb = boto3.resource("dynamodb", region_name=REGION)
-table    = dynamodb.Table(TABLE_NAME)
-secrets  = boto3.client("secretsmanager", region_name=REGION)
+# keep-alive + a pool wide enough for the worker threads; adaptive retries absorb throttles
+AWS_CFG  = Config(max_pool_connections=64, tcp_keepalive=True,
+                  retries={"max_attempts": 10, "mode": "adaptive"})
+dynamodb = boto3.resource("dynamodb", region_name=REGION, config=AWS_CFG)
 EMAIL_RE = re.compile(r"[A-Z0-9._%+-]+@[A-Z0-9.-]+\.[A-Z]{2,}", re.I)
 
+_API_SLOTS  = threading.BoundedSemaphore(API_CONCURRENCY)  # replaces per-card sleep
+_HTTP_POOL  = ThreadPoolExecutor(max_workers=API_CONCURRENCY)     # shared by all project workers
+_WRITE_POOL = ThreadPoolExecutor(max_workers=WRITE_CONCURRENCY)
+ddb         = dynamodb.meta.client        # low-level client: thread-safe, no TypeSerializer pass
+
 # ─────────── helpers ────────────────────────────────────────────────
+def _retry_after(headers) -> Optional[float]:
+    """Seconds the server asked us to wait (429/503), capped at 30 s."""
+    try:
+        return min(float(headers.get("Retry-After")), 30.0)
+    except (TypeError, ValueError):       # header missing or an HTTP-date
+        return None
+
+class _Bucket:
+    """Token bucket: at most `rate` ProjectPlace calls per second across threads."""
+    def __init__(self, rate: float):
+        self.rate, self.tokens, self.last = rate, rate, time.monotonic()
+        self.lock = threading.Lock()
+
+    def take(self) -> None:
+        if self.rate <= 0:                # PP_RATE=0 → unlimited
+            return
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.last) * self.rate)
+            self.last   = now
+            wait = (1 - self.tokens) / self.rate if self.tokens < 1 else 0.0
+            self.tokens -= 1
+        if wait:
+            time.sleep(wait)
+
+_RATE = _Bucket(PP_RATE)
+
+@functools.lru_cache(maxsize=2)
+def _auth(token: Optional[str]) -> Dict[str,str]:
+    hdrs = {"Accept-Encoding": "gzip"}
+    if token:
+        hdrs["Authorization"] = f"Bearer {token}"
+    return hdrs
+
 def _http(url: str, token: Optional[str] = None) -> Any:
-    headers = {"Authorization": f"Bearer {token}"} if token else {}
+    """GET over the shared keep-alive pool (enricher_core.HTTP); gzip is decoded by urllib3.
+    Retries stay here so the rate bucket and Retry-After apply to every attempt."""
+    headers = _auth(token)                # one dict per token, not per request
     delay = 0.8
     for _ in range(5):
+        _RATE.take()
+        wait = None
         try:
-            with request.urlopen(request.Request(url, headers=headers), timeout=10) as r:
-                return json.loads(r.read())
-        except (urllib.error.HTTPError, urllib.error.URLError) as e:
-            if isinstance(e, urllib.error.HTTPError) and e.code < 500 and e.code != 429:
-                raise
-            time.sleep(delay + random.random() * 0.3)
-            delay *= 1.8
+            with _API_SLOTS:
+                r = HTTP.request("GET", url, headers=headers, retries=False)
+            if r.status < 400:
+                return _loads(r.data) if r.data else []
+            if r.status < 500 and r.status != 429:
+                raise RuntimeError(f"HTTP {r.status}: {r.data.decode(errors='replace')}")
+            wait = _retry_after(r.headers)
+        except urllib3.exceptions.HTTPError:
+            pass                          # connect / read failure → back off and retry
+        time.sleep(wait if wait is not None else delay + random.random() * 0.3)
+        delay *= 1.8
     raise RuntimeError("HTTP retries exhausted")
 
 def _token() -> str:
-    sec = json.loads(secrets.get_secret_value(SecretId=SECRET_NAME)["SecretString"])
-    body = parse.urlencode({
-        "grant_type":    "client_credentials",
-        "client_id":     sec["PROJECTPLACE_ROBOT_CLIENT_ID"],
-        "client_secret": sec["PROJECTPLACE_ROBOT_CLIENT_SECRET"],
-    }).encode()
-    with request.urlopen(request.Request(f"{API_BASE}/oauth2/access_token", data=body,
-                                         headers={"Content-Type":"application/x-www-form-urlencoded"})) as r:
-        return json.loads(r.read())["access_token"]
+    return get_token(SECRET_NAME)         # cached secret + bearer token (enricher_core)
 
 # ProjectPlace one-liners
 g_cards    = lambda pid,tok: _http(f"{API_BASE}/1/projects/{pid}/cards", tok)
-g_comments = lambda cid,tok: _http(f"{API_BASE}/1/cards/{cid}/comments", tok)
-g_members  = lambda pid,tok: _http(f"{API_BASE}/1/projects/{pid}/members", tok)
-
-def _pm_email(pid: str, tok: str, creator: Any) -> tuple[str,str]:
-    for m in g_members(pid, tok):
-        if str(m.get("id")) == str(creator):
-            return m.get("email",""), m.get("name","")
-    return "",""
-
-# Decimal-safe conversion
-def _d(val: Any) -> Any:
-    if isinstance(val, float):
-        if math.isfinite(val) and abs(val) < 1e38:
-            try:
-                return Decimal(str(val))
-            except (InvalidOperation, OverflowError):
-                return str(val)
-        return str(val)                     # huge / inf / nan
-    if isinstance(val, list):
-        return [_d(v) for v in val]
-    if isinstance(val, dict):
-        return {k: _d(v) for k, v in val.items()}
-    return val                              # int, str, bool, None
+g_comments = lambda cid,tok,n=0: _http(f"{API_BASE}/1/cards/{cid}/comments"
+                                       + (f"?limit={n}" if n else ""), tok)
+
+# UpdateExpression fields: (attribute, placeholder); last_refreshed is always SET
+_UPDATE_FIELDS = (
+    ("title", ":title"),                  ("description", ":description"),
+    ("client_email", ":client_email"),    ("pm_email", ":pm_email"),
+    ("pm_name", ":pm_name"),              ("assignee", ":assignee"),
+    ("assignee_id", ":assignee_id"),      ("board_id", ":board_id"),
+    ("board_name", ":board_name"),        ("connected_issues", ":connected_issues"),
+    ("connected_risks", ":connected_risks"), ("contributors", ":contributors"),
+    ("created_time", ":created_time"),    ("creator", ":creator"),
+    ("dependencies", ":dependencies"),    ("planlet", ":planlet"),
+    ("planlet_id", ":planlet_id"),        ("progress", ":progress"),
+    ("#project", ":project_val"),         ("reported_time", ":reported_time"),
+    ("lebel_id", ":label_id"),            ("due_date", ":due_date"),
+    ("comments", ":comments"),            ("direct_url", ":direct_url"),
+    ("is_done", ":is_done"),              ("is_blocked", ":is_blocked"),
+    ("is_blocked_reason", ":blocked_reason"), ("checklist", ":checklist"),
+    ("column_id", ":column_id"),          ("board_display_order", ":board_display_order"),
+    ("content_hash", ":content_hash"),
+)
+_EXPR_NAMES = {"#project": "project"}     # #project is always referenced (SET or REMOVE)
+
+_EXPR_CACHE: Dict[tuple,str] = {}          # present-field mask → UpdateExpression
+
+def _build_expr(mask: tuple) -> str:
+    sets    = [f"{n} = {ph}" for (n, ph), on in zip(_UPDATE_FIELDS, mask) if on]
+    removes = [n for (n, _), on in zip(_UPDATE_FIELDS, mask) if not on]
+    expr = "SET " + ", ".join(sets + ["last_refreshed = :now"])
+    return expr + (" REMOVE " + ", ".join(removes) if removes else "")
+
+def _update_args(attr: Dict[str,Any]) -> Dict[str,Any]:
+    """SET only non-empty values; None / "" attributes are REMOVEd (no value on the wire)."""
+    mask, vals = [], {":now": attr[":now"]}     # :now arrives pre-serialised
+    for _, ph in _UPDATE_FIELDS:
+        val = attr[ph]
+        on  = not (val is None or val == "")
+        mask.append(on)
+        if on:
+            vals[ph] = to_av(val)
+    key  = tuple(mask)
+    expr = _EXPR_CACHE.get(key)
+    if expr is None:                      # few distinct shapes → built once each
+        expr = _EXPR_CACHE[key] = _build_expr(key)
+    return {"UpdateExpression": expr,
+            "ExpressionAttributeNames": _EXPR_NAMES,
+            "ExpressionAttributeValues": vals}
+
+# card → placeholder copies, resolved once at import instead of per card
+_CARD_FIELDS = (                          # (placeholder, card key)
+    (":description", "description"),      (":assignee", "assignee"),
+    (":assignee_id", "assignee_id"),      (":board_name", "board_name"),
+    (":created_time", "created_time"),    (":planlet_id", "planlet_id"),
+    (":reported_time", "reported_time"),  (":label_id", "label_id"),
+    (":due_date", "due_date"),            (":direct_url", "direct_url"),
+    (":is_done", "is_done"),              (":is_blocked", "is_blocked"),
+    (":blocked_reason", "is_blocked_reason"), (":column_id", "column_id"),
+    (":connected_issues", "connected_issues"), (":connected_risks", "connected_risks"),
+    (":contributors", "contributors"),    (":creator", "creator"),
+    (":dependencies", "dependencies"),    (":planlet", "planlet"),
+    (":progress", "progress"),            (":project_val", "project"),   # alias
+    (":board_display_order", "display_order"),
+)
+
+# ─────────── per-project worker ────────────────────────────────────
+def _card_comments(card: Dict[str,Any], token: str) -> list:
+    if not card.get("comment_count"):
+        return []
+    if card.get("title","") == "Client_Email":    # only comments[0] is used
+        return g_comments(card["id"], token, 1)
+    return g_comments(card["id"], token, COMMENTS_LIMIT)
+
+def _content_hash(attr: Dict[str,Any]) -> str:
+    """Stable digest of everything written for a card (last_refreshed excluded)."""
+    blob = json.dumps(attr, sort_keys=True, default=str, separators=(",", ":"))
+    return hashlib.blake2b(blob.encode(), digest_size=16).hexdigest()
+
+def _enrich_project(pid: str, token: str, now_av: Dict[str,str],
+                    known: Dict[str,str]) -> tuple[int,int]:
+    """known: card_id → stored content_hash for this project."""
+    rows, skipped, writes = 0, 0, []
+    cards = g_cards(pid, token)
+    if not cards:
+        print(f"∅ no cards for {pid}")
+        return rows, skipped
+    # once per project, memo per creator; a failed /members skips the project – an empty
+    # map would REMOVE pm_email / pm_name from every card
+    pm_of = pm_lookup(get_members(pid, token, MEMBERS_TTL, raise_errors=True))
+    # comment GETs of every project share one pool; _API_SLOTS still caps the total
+    fetched = _HTTP_POOL.map(lambda c: _card_comments(c, token), cards)
+    for card, comments in zip(cards, fetched):
+        cid   = str(card["id"])
+        title = card.get("title","")
+
+        # client_email logic
+        if title == "Client_Email" and comments:
+            client_email = comments[0].get("text","")
+        else:
+            client_email = next(
+                (m.group(0) for m in
+                 (EMAIL_RE.search(c.get("text","")) for c in comments) if m),
+                ""
+            )
+
+        pm_email, pm_name = pm_of((card.get("creator") or {}).get("id"))
+
+        attr: Dict[str,Any] = {ph: card.get(src) for ph, src in _CARD_FIELDS}
+        attr[":title"]        = title
+        attr[":client_email"] = client_email
+        attr[":pm_email"]     = pm_email
+        attr[":pm_name"]      = pm_name
+        attr[":board_id"]     = str(card.get("board_id"))
+        attr[":comments"]     = comments
+        attr[":checklist"]    = card.get("checklist", [])
+        attr[":content_hash"] = h = _content_hash(attr)
+        attr[":now"]          = now_av
+
+        if not FORCE_REFRESH and known.get(cid) == h:
+            skipped += 1                  # source unchanged → no WCU spent
+        elif not DRY_RUN:
+            writes.append({"TableName": TABLE_NAME,
+                           "Key": {"project_id": {"S": pid}, "card_id": {"S": cid}},
+                           "ReturnValues": "NONE",
+                           **_update_args(attr)})
+
+        rows += 1
+
+    # UpdateItem (no batch form) → overlap the round-trips on the shared write pool
+    for _ in _WRITE_POOL.map(lambda kw: ddb.update_item(**kw), writes):
+        pass
+    return rows, skipped
+
+def _scan_segment(seg: int) -> list:
+    """One parallel-scan segment, every page (raw {"S": …} values)."""
+    pages = ddb.get_paginator("scan").paginate(
+        TableName=TABLE_NAME, ProjectionExpression="project_id, card_id, content_hash",
+        Segment=seg, TotalSegments=SCAN_SEGMENTS, PaginationConfig={"PageSize": 1000})
+    return [it for p in pages for it in p["Items"]]
 
 # ─────────── Lambda handler ────────────────────────────────────────
 def lambda_handler(event=None, context=None):
     token = _token()
     start = time.time()
+    now_av = {"N": str(int(start))}       # one last_refreshed stamp per run, serialised once
+
+    # full-table project list + stored hashes; segments are read concurrently
+    known: Dict[str,Dict[str,str]] = {}
+    with ThreadPoolExecutor(max_workers=SCAN_SEGMENTS) as pool:
+        for items in pool.map(_scan_segment, range(SCAN_SEGMENTS)):
+            for it in items:
+                h = it.get("content_hash", {}).get("S")
+                known.setdefault(it["project_id"]["S"], {})[it["card_id"]["S"]] = h
+
+    rows, skipped, failed = 0, 0, 0
+    if not known:
+        print("∅ table holds no projects – nothing to enrich")
+        return {"statusCode":200, "body": "Enriched 0 cards (no projects)"}
+
+    # projects are independent → fan out; _API_SLOTS paces ProjectPlace calls
+    with ThreadPoolExecutor(max_workers=ENRICH_CONCURRENCY) as pool:
+        # biggest projects first → the long ones don't start last and stretch the tail
+        order   = sorted(known.items(), key=lambda kv: len(kv[1]), reverse=True)
+        futures = {pool.submit(_enrich_project, pid, token, now_av, hashes): pid
+                   for pid, hashes in order}
+        for fut in as_completed(futures):
+            try:
+                r, k = fut.result()
+                rows += r; skipped += k
+            except Exception as e:
+                failed += 1
+                print(f"❌ project {futures[fut]} failed: {e}")
 
-    # full-table project list (paginated)
-    projects: set[str] = set()
-    resp = table.scan(ProjectionExpression="project_id")
-    projects.update(item["project_id"] for item in resp["Items"])
-    while "LastEvaluatedKey" in resp:
-        resp = table.scan(ExclusiveStartKey=resp["LastEvaluatedKey"],
-                          ProjectionExpression="project_id")
-        projects.update(item["project_id"] for item in resp["Items"])
-
-    rows = 0
-    for pid in projects:
-        for card in g_cards(pid, token):
-            cid   = str(card["id"])
-            title = card.get("title","")
-            comments = g_comments(cid, token) if card.get("comment_count") else []
-
-            # client_email logic
-            if title == "Client_Email" and comments:
-                client_email = comments[0].get("text","")
-            else:
-                client_email = next(
-                    (m.group(0) for m in
-                     (EMAIL_RE.search(c.get("text","")) for c in comments) if m),
-                    ""
-                )
-
-            pm_email, pm_name = _pm_email(pid, token, card.get("creator",{}).get("id"))
-
-            attr: Dict[str,Any] = {
-                ":title":          title,
-                ":description":    card.get("description"),
-                ":client_email":   client_email,
-                ":pm_email":       pm_email,
-                ":pm_name":        pm_name,
-                ":assignee":       card.get("assignee"),
-                ":assignee_id":    card.get("assignee_id"),
-                ":board_id":       str(card.get("board_id")),
-                ":board_name":     card.get("board_name"),
-                ":connected_issues": _d(card.get("connected_issues")),
-                ":connected_risks":  _d(card.get("connected_risks")),
-                ":contributors":     _d(card.get("contributors")),
-                ":created_time":     card.get("created_time"),
-                ":creator":          _d(card.get("creator")),
-                ":dependencies":     _d(card.get("dependencies")),
-                ":planlet":          _d(card.get("planlet")),
-                ":planlet_id":       card.get("planlet_id"),
-                ":progress":         _d(card.get("progress")),
-                ":project_val":      _d(card.get("project")),  # alias
-                ":reported_time":    card.get("reported_time"),
-                ":label_id":        card.get("label_id"),
-                ":due_date":        card.get("due_date"),
-                ":comments":         _d(comments),             
-                ":direct_url":       card.get("direct_url"),
-                ":is_done":          card.get("is_done"),
-                ":is_blocked":       card.get("is_blocked"),
-                ":blocked_reason":   card.get("is_blocked_reason"),
-                ":checklist":        _d(card.get("checklist", [])),
-                ":column_id":        card.get("column_id"),
-                ":board_display_order": _d(card.get("display_order")),
-                ":now": int(time.time()),
-            }
-
-            if not DRY_RUN:
-                table.update_item(
-                    Key={"project_id": pid, "card_id": cid},
-                    UpdateExpression="""
-                        SET title               = :title,
-                            description         = :description,
-                            client_email        = :client_email,
-                            pm_email            = :pm_email,
-                            pm_name             = :pm_name,
-                            assignee            = :assignee,
-                            assignee_id         = :assignee_id,
-                            board_id            = :board_id,
-                            board_name          = :board_name,
-                            connected_issues    = :connected_issues,
-                            connected_risks     = :connected_risks,
-                            contributors        = :contributors,
-                            created_time        = :created_time,
-                            creator             = :creator,
-                            dependencies        = :dependencies,
-                            planlet             = :planlet,
-                            planlet_id          = :planlet_id,
-                            progress            = :progress,
-                            #project            = :project_val,
-                            reported_time       = :reported_time,
-                            lebel_id            = :label_id,
-                            due_date            = :due_date,
-                            comments            = :comments,
-                            direct_url          = :direct_url,
-                            is_done             = :is_done,
-                            is_blocked          = :is_blocked,
-                            is_blocked_reason   = :blocked_reason,
-                            checklist           = :checklist,
-                            column_id           = :column_id,
-                            board_display_order = :board_display_order,
-                            last_refreshed      = :now
-                    """,
-                    ExpressionAttributeNames={"#project":"project"},
-                    ExpressionAttributeValues=attr
-                )
-
-            rows += 1
-            time.sleep(0.05)      # friendly to ProjectPlace API
-
-    print(f"✅ Enriched {rows} cards in {int(time.time()-start)} s")
+    print(f"✅ Enriched {rows} cards ({skipped} unchanged) in {int(time.time()-start)} s"
+          f" ({failed} projects failed)")
     return {"statusCode":200,
-            "body": f"Enriched {rows} cards in {int(time.time()-start)} s"}
+            "body": f"Enriched {rows} cards ({skipped} unchanged) in {int(time.time()-start)} s"
+                    f" ({failed} projects failed)"}
@@ -1,60 +1,251 @@
 #!/usr/bin/env python3
 """
-One-project metadata enricher  –  Upsert-safe (v2.0, 2025-05-10)
+One-project metadata enricher  –  Upsert-safe (v2.1)
 
 Key points
 ----------
-✔ Uses  UpdateItem  so card metadata is refreshed
-  but approval fields *status, sent_timestamp, approver* are never overwritten.
+✔ SET-only Update actions, ≤100 per TransactWriteItems call: approval fields
+  *token, status, sent_timestamp, approver* are never read back or overwritten.
 ✔ No ConditionExpression  → never throws ConditionalCheckFailedException.
-✔ Logs the write-mode (INSERT vs UPDATE) for every card.
+✔ Logs every upserted card.
+✔ Optional fan-out: with FANOUT_QUEUE_URL set the handler only lists cards and
+  queues them ≤10 per SQS message (≤256 KB per message and per batch); sqs_handler
+  writes each message on its own (BatchSize=10 event source, partial batch
+  failures) → no 15-min ceiling. Cards too big for SQS are written inline.
 """
 
-import os, json, time, uuid, boto3
+import os, json, time, functools, itertools, boto3
+from botocore.exceptions import ClientError
+from decimal import Decimal
 from typing import Optional
-from urllib import request, parse, error
+try:                                    # streaming /cards parser, bundled like orjson
+    import ijson
+except ImportError:
+    ijson = None
+from enricher_core import (AWS_CFG, API_BASE_URL, HTTP, auth_headers, get_json,
+                           get_token, get_members, pm_lookup, to_av, loads)
 
-REGION       = os.environ["AWS_REGION"]
-TABLE_NAME   = os.environ["DYNAMODB_ENRICHMENT_TABLE"]
+TABLE_NAME   = os.environ.get("DYNAMODB_ENRICHMENT_TABLE", "")
 SECRET_NAME  = os.environ.get("SECRET_NAME", "ProjectPlaceAPICredentials")
-API_BASE_URL = "https://api.projectplace.com"
+FANOUT_QUEUE_URL = os.environ.get("FANOUT_QUEUE_URL", "")  # set → list-and-fan-out mode
+MEMBERS_TTL  = int(os.environ.get("MEMBERS_TTL", "300"))  # seconds a warm container reuses /members
+CARDS_PER_MESSAGE = 10
+SQS_MAX_BYTES = 256 * 1024               # SQS cap per message *and* per SendMessageBatch
+TRANSACT_MAX_ITEMS = 100                 # TransactWriteItems limits: 100 actions, 4 MB
+TRANSACT_MAX_BYTES = 3_500_000           # (serialised estimate, headroom for the envelope)
 
-ddb     = boto3.resource("dynamodb", region_name=REGION).Table(TABLE_NAME)
-secrets = boto3.client("secretsmanager", region_name=REGION)
+
+# built on first use (env is read then, not at import) and reused by warm invocations
+@functools.lru_cache(maxsize=1)
+def _ddb():
+    """Low-level client: items travel as ready-made AttributeValues (no TypeSerializer).
+    Straight to DynamoDB, never DAX: the approval Lambdas write these rows directly, so a
+    DAX item cache would hand out stale approval fields."""
+    return boto3.client("dynamodb", region_name=os.environ["AWS_REGION"], config=AWS_CFG)
+
+
+@functools.lru_cache(maxsize=1)
+def _sqs():
+    return boto3.client("sqs", region_name=os.environ["AWS_REGION"], config=AWS_CFG)
 
 
 # ─── helper functions ────────────────────────────────────────────────────────
 def get_projectplace_token() -> str:
-    creds = json.loads(secrets.get_secret_value(SecretId=SECRET_NAME)["SecretString"])
-    data  = parse.urlencode({
-        "grant_type":    "client_credentials",
-        "client_id":     creds["PROJECTPLACE_ROBOT_CLIENT_ID"],
-        "client_secret": creds["PROJECTPLACE_ROBOT_CLIENT_SECRET"],
-    }).encode()
-    req = request.Request(f"{API_BASE_URL}/oauth2/access_token", data=data)
-    req.add_header("Content-Type", "application/x-www-form-urlencoded")
-    with request.urlopen(req) as resp:
-        return json.loads(resp.read())["access_token"]
-
-
-def get_pm_email(project_id: str, token: str, creator_id: str) -> tuple[str, str]:
-    url = f"{API_BASE_URL}/1/projects/{project_id}/members"
-    req = request.Request(url, headers={"Authorization": f"Bearer {token}"})
-    try:
-        with request.urlopen(req) as resp:
-            for m in json.loads(resp.read()):
-                if str(m.get("id")) == str(creator_id):
-                    return m.get("email", ""), m.get("name", "")
-    except error.HTTPError as e:
-        print("⚠️ member fetch failed:", e.read().decode())
-    return "", ""
+    return get_token(SECRET_NAME)
 
 
 def get_all_cards(project_id: str, token: str) -> list[dict]:
-    url = f"{API_BASE_URL}/1/projects/{project_id}/cards"
-    req = request.Request(url, headers={"Authorization": f"Bearer {token}"})
-    with request.urlopen(req) as resp:
-        return json.loads(resp.read())
+    return get_json(f"{API_BASE_URL}/1/projects/{project_id}/cards", token)
+
+
+def iter_cards(project_id: str, token: str):
+    """Yield cards one by one as the /cards body streams in (whole-body parse without ijson)."""
+    if ijson is None:
+        yield from get_all_cards(project_id, token)
+        return
+    resp = HTTP.request("GET", f"{API_BASE_URL}/1/projects/{project_id}/cards",
+                        headers=auth_headers(token), preload_content=False)
+    try:
+        if resp.status >= 400:
+            raise RuntimeError(f"HTTP {resp.status}: {resp.data.decode(errors='replace')}")
+        yield from ijson.items(resp, "item")      # numbers arrive as Decimal → DynamoDB-ready
+    finally:
+        resp.release_conn()
+
+
+@functools.lru_cache(maxsize=4)
+def _update_expr(fields: tuple) -> tuple:
+    """SET every fresh attribute (aliased – several are reserved words) and REMOVE
+    content_hash, which describes the full enricher's values, not these."""
+    names = {f"#a{i}": f for i, f in enumerate(fields)}
+    names["#h"] = "content_hash"
+    sets  = ", ".join(f"#a{i} = :a{i}" for i in range(len(fields)))
+    return f"SET {sets} REMOVE #h", names
+
+
+def _update_action(item: dict) -> dict:
+    """Fresh card metadata → one TransactWriteItems Update (keys are not SET)."""
+    fields = tuple(k for k in item if k not in ("project_id", "card_id"))
+    expr, names = _update_expr(fields)
+    return {"Update": {
+        "TableName": TABLE_NAME,
+        "Key": {"project_id": {"S": item["project_id"]}, "card_id": {"S": item["card_id"]}},
+        "UpdateExpression": expr,
+        "ExpressionAttributeNames": names,
+        "ExpressionAttributeValues": {f":a{i}": to_av(item[f]) for i, f in enumerate(fields)},
+    }}
+
+
+def _transact_chunks(actions: list):
+    """Split into requests of ≤TRANSACT_MAX_ITEMS actions and ≈TRANSACT_MAX_BYTES."""
+    chunk, size = [], 0
+    for act in actions:
+        n = len(json.dumps(act))
+        if chunk and (len(chunk) == TRANSACT_MAX_ITEMS or size + n > TRANSACT_MAX_BYTES):
+            yield chunk
+            chunk, size = [], 0
+        chunk.append(act)
+        size += n
+    if chunk:
+        yield chunk
+
+
+# cancellation reasons worth another try ("None" = the action itself was fine)
+_RETRY_REASONS = {"None", "TransactionConflict", "ThrottlingError",
+                  "ProvisionedThroughputExceeded"}
+
+
+def _transact_write(actions: list) -> None:
+    """TransactWriteItems per chunk; a chunk cancelled by a conflicting write (e.g. the
+    approval mailer touching the same card) or by throttling is retried with backoff."""
+    for chunk in _transact_chunks(actions):
+        delay = 0.05
+        for attempt in range(6):
+            try:
+                _ddb().transact_write_items(TransactItems=chunk)
+            except ClientError as e:
+                codes = {r.get("Code") for r in e.response.get("CancellationReasons", [])}
+                if (e.response["Error"]["Code"] != "TransactionCanceledException"
+                        or not codes <= _RETRY_REASONS
+                        or attempt == 5):
+                    raise
+                time.sleep(delay)
+                delay = min(delay * 2, 5)
+            else:                         # logged only once DynamoDB committed the chunk
+                for act in chunk:
+                    print(f"✅ UPSERT {act['Update']['Key']['card_id']['S']}")
+                break
+
+
+def _card_item(project_id: str, pm_of, card: dict, now: int) -> dict:
+    """Attributes that are safe to overwrite every run."""
+    title      = card.get("title", "")
+    comments   = card.get("comments", [])
+    creator_id = (card.get("creator") or {}).get("id")
+
+    client_email = (
+        comments[0]
+        if title == "Client_Email" and comments else ""
+    )
+    pm_email, pm_name = pm_of(creator_id)
+
+    return {
+        "project_id":   str(project_id),
+        "card_id":      str(card.get("id")),
+        "title":        title,
+        "description":  card.get("description"),
+        "client_email": client_email,
+        "pm_email":     pm_email,
+        "pm_name":      pm_name,
+        "board_id":     str(card.get("board_id")),
+        "board_name":   card.get("board_name"),
+        "column_id":    card.get("column_id"),
+        "is_done":      card.get("is_done"),
+        "is_blocked":   card.get("is_blocked"),
+        "is_blocked_reason": card.get("is_blocked_reason"),
+        "checklist":    card.get("checklist", []),
+        "comments":     comments,
+        "progress":     card.get("progress"),
+        "direct_url":   card.get("direct_url"),
+        "last_refreshed": now,
+    }
+
+
+def _write_cards(project_id: str, pm_of, cards: list, now: int) -> int:
+    """Upsert fresh metadata for ≤100 cards; attributes not listed here stay untouched."""
+    actions = [_update_action(_card_item(project_id, pm_of, c, now)) for c in cards]
+    _transact_write(actions)              # raises if a chunk could not be committed
+    return len(actions)
+
+
+# ─── SQS fan-out ─────────────────────────────────────────────────────────────
+def _num(d: Decimal):
+    # ijson hands out Decimals; keep ints as ints in the message body
+    return int(d) if d == d.to_integral_value() else float(d)
+
+
+def _messages(project_id: str, cards, oversized: list):
+    """(body, n_cards) of ≤CARDS_PER_MESSAGE cards and ≤SQS_MAX_BYTES each; a card that
+    cannot fit any message is appended to `oversized` and written by the caller."""
+    head = '{"project_id": %s, "cards": [' % json.dumps(str(project_id))
+    parts, size = [], len(head) + 2                 # + closing "]}"
+    for card in cards:
+        part = json.dumps(card, default=_num)       # ASCII-escaped → len() == bytes
+        if len(head) + len(part) + 2 > SQS_MAX_BYTES:
+            oversized.append(card)
+            continue
+        if parts and (len(parts) == CARDS_PER_MESSAGE or size + len(part) + 1 > SQS_MAX_BYTES):
+            yield head + ",".join(parts) + "]}", len(parts)
+            parts, size = [], len(head) + 2
+        parts.append(part)
+        size += len(part) + 1
+    if parts:
+        yield head + ",".join(parts) + "]}", len(parts)
+
+
+def _batches(messages):
+    """Group messages 10 per SendMessageBatch without exceeding SQS_MAX_BYTES in total."""
+    batch, size = [], 0
+    for body, n in messages:
+        if batch and (len(batch) == 10 or size + len(body) > SQS_MAX_BYTES):
+            yield batch
+            batch, size = [], 0
+        batch.append((body, n))
+        size += len(body)
+    if batch:
+        yield batch
+
+
+def _fan_out(project_id: str, cards) -> tuple:
+    """Queue the cards in size-bounded messages and batches.
+    Returns (cards queued, cards too large for SQS – to be written inline)."""
+    queued, oversized = 0, []
+    for batch in _batches(_messages(project_id, cards, oversized)):
+        entries = [{"Id": str(i), "MessageBody": body} for i, (body, _) in enumerate(batch)]
+        failed  = _sqs().send_message_batch(QueueUrl=FANOUT_QUEUE_URL, Entries=entries).get("Failed")
+        if failed:
+            raise RuntimeError(f"SendMessageBatch failed for {len(failed)} message(s): {failed[0]}")
+        queued += sum(n for _, n in batch)
+    return queued, oversized
+
+
+def sqs_handler(event: dict, context=None):
+    """One SQS message = one project's ≤10 cards; failed messages are retried alone
+    (needs FunctionResponseTypes=["ReportBatchItemFailures"] on the event source mapping –
+    scripts/deploy_metadata_enricher_by_id.py sets it)."""
+    token, now, failures = get_projectplace_token(), int(time.time()), []
+    pm_by_project: dict = {}              # messages of one project share a members lookup
+    for rec in event.get("Records", []):
+        try:
+            body = loads(rec["body"])
+            pid  = body["project_id"]
+            if pid not in pm_by_project:
+                pm_by_project[pid] = pm_lookup(get_members(pid, token, MEMBERS_TTL))
+            _write_cards(pid, pm_by_project[pid], body["cards"], now)
+        except Exception as e:
+            print(f"❌ message {rec.get('messageId')} failed:", e)
+            failures.append({"itemIdentifier": rec["messageId"]})
+    return {"batchItemFailures": failures}
 
 
 # ─── Lambda handler ──────────────────────────────────────────────────────────
@@ -70,66 +261,23 @@ def lambda_handler(event: Optional[dict] = None, context=None):
     writes = 0
 
     try:
-        for card in get_all_cards(project_id, token):
-            cid        = str(card.get("id"))
-            title      = card.get("title", "")
-            comments   = card.get("comments", [])
-            creator_id = str(card.get("creator", {}).get("id"))
-
-            client_email = (
-                comments[0]
-                if title == "Client_Email" and comments else ""
-            )
-            pm_email, pm_name = get_pm_email(project_id, token, creator_id)
-
-            # attributes that are safe to overwrite every run
-            attr = {
-                ":title":        title,
-                ":description":  card.get("description"),
-                ":client_email": client_email,
-                ":pm_email":     pm_email,
-                ":pm_name":      pm_name,
-                ":board_id":     str(card.get("board_id")),
-                ":board_name":   card.get("board_name"),
-                ":column_id":    card.get("column_id"),
-                ":is_done":      card.get("is_done"),
-                ":is_blocked":   card.get("is_blocked"),
-                ":blocked_reason": card.get("is_blocked_reason"),
-                ":checklist":    card.get("checklist", []),
-                ":comments":     comments,
-                ":progress":     card.get("progress"),
-                ":direct_url":   card.get("direct_url"),
-            }
-
-            resp = ddb.update_item(
-                Key={"project_id": str(project_id), "card_id": cid},
-                UpdateExpression="""
-                    SET title = :title,
-                        description = :description,
-                        client_email = :client_email,
-                        pm_email = :pm_email,
-                        pm_name  = :pm_name,
-                        board_id = :board_id,
-                        board_name = :board_name,
-                        column_id = :column_id,
-                        is_done   = :is_done,
-                        is_blocked = :is_blocked,
-                        is_blocked_reason = :blocked_reason,
-                        checklist = :checklist,
-                        comments  = :comments,
-                        progress  = :progress,
-                        direct_url = :direct_url,
-                        last_refreshed = :now
-                """,
-                ExpressionAttributeValues={**attr, ":now": int(time.time())},
-                ReturnValues="UPDATED_NEW"
-            )
-
-            op = "INSERT" if not resp.get("Attributes") else "UPDATE"
-            writes += 1
-            print(f"✅ {op} {cid}")
-
-            time.sleep(0.05)  # API-friendly pause
+        cards = iter_cards(project_id, token)
+        if FANOUT_QUEUE_URL:
+            queued, oversized = _fan_out(project_id, cards)
+            if oversized:                 # rare: a card above the SQS size cap
+                pm_of = pm_lookup(get_members(project_id, token, MEMBERS_TTL))
+                for chunk in (oversized[i:i + 100] for i in range(0, len(oversized), 100)):
+                    writes += _write_cards(project_id, pm_of, chunk, int(time.time()))
+            return {"statusCode": 202,
+                    "body": f"Queued {queued} cards of {project_id} for enrichment"
+                            f" ({writes} oversized cards written directly)"}
+
+        pm_of = pm_lookup(get_members(project_id, token, MEMBERS_TTL))   # one /members call, memo per creator
+        now   = int(time.time())
+
+        # 100 cards at a time (one TransactWriteItems) → memory stays flat for any project size
+        for chunk in iter(lambda: list(itertools.islice(cards, 100)), []):
+            writes += _write_cards(project_id, pm_of, chunk, now)
 
     except Exception as e:
         print("❌ Enrichment error:", e)
@@ -2,23 +2,34 @@
 """
 send_approval_email.py – v1.7.4  (2025-05-24)
 
-• Generates a UUID-4 approval_token, persists status=pending
+• Generates a random 128-bit approval_token (hex), persists status=pending
 • Looks up *Client_Email* card for recipient + latest comment
-• Auto-discovers the newest Acta PDF in S3 (actas/…_<project>.pdf)
-• Sends branded HTML mail via SES with Approve / Reject links + comment box
+• Auto-discovers the newest Acta PDF in S3 (actas/<project>/…, else actas/…_<project>.pdf)
+• Sends branded HTML mail via SES v2 with Approve / Reject links + comment box
+• Actas too big for SES (> PDF_LINK_MIN_MB, default 28) are linked via a presigned URL
+• recipient may be one address, a comma-separated string or a list (≤ 50)
 """
 
 from __future__ import annotations
 
-import os, re, json, time, uuid, mimetypes, urllib.parse
+import os, re, json, copy, base64, binascii, functools
+from email.header import Header
+from concurrent.futures import ThreadPoolExecutor, wait
+from html import escape as html_escape
+from tempfile import SpooledTemporaryFile
+from string import Template
 from typing import Any, Dict, Optional
 
 import boto3
+from botocore.config import Config
 from botocore.exceptions import ClientError
-from boto3.dynamodb.conditions import Key
-from email.message import EmailMessage
 from datetime import datetime
 
+try:                                     # C parser when bundled; stdlib otherwise
+    from orjson import loads as _loads
+except ImportError:
+    _loads = json.loads
+
 # ── helpers ─────────────────────────────────────────────────────────
 VALID_NAME = re.compile(r"^[a-zA-Z0-9_.\-]+$")
 
@@ -31,7 +42,10 @@ def env(key: str, required: bool = True) -> str | None:
     return val or None
 
 # ── ENV ─────────────────────────────────────────────────────────────
-REGION       = env("AWS_REGION") or boto3.Session().region_name
+# one Session for every client: credential chain + region resolved once per container
+SESSION      = boto3.session.Session(
+    region_name=env("AWS_REGION", required=False) or env("AWS_DEFAULT_REGION", required=False))
+REGION       = SESSION.region_name                       # falls back to ~/.aws/config off-Lambda
 TABLE_NAME   = env("DYNAMODB_ENRICHMENT_TABLE")
 BUCKET_NAME  = env("S3_BUCKET_NAME")
 EMAIL_SOURCE = env("EMAIL_SOURCE")
@@ -39,18 +53,63 @@ API_ID       = env("ACTA_API_ID")
 API_STAGE    = env("API_STAGE") or "prod"
 
 API_BASE  = f"https://{API_ID}.execute-api.{REGION}.amazonaws.com/{API_STAGE}/approve"
+APPROVE_URL = API_BASE + "?token={}&status=approved"    # filled per mail with .format
+REJECT_URL  = API_BASE + "?token={}&status=rejected"
+PDF_TYPE    = "application/pdf"                          # every Acta
+OCTET_TYPE  = "application/octet-stream"                 # any other key; mimetypes never loaded
+PDF_SPOOL_MAX = 4 * 1024 * 1024                          # bytes kept in RAM while downloading
+PDF_CACHE_MAX = 5 * 1024 * 1024                          # larger Actas are never cached
+# Actas above this are linked (presigned GET) instead of attached → never read into the Lambda
+# 28 MB → ~38 MB once base64-encoded, just under the 40 MB SES v2 raw-message limit
+PDF_LINK_MIN  = int(env("PDF_LINK_MIN_MB", required=False) or 28) * 1024 * 1024
+PDF_LINK_TTL  = 7 * 24 * 3600                            # SigV4 maximum; the role session may end sooner
 BRAND_CLR = "#1b998b"
+MAX_RECIPIENTS = 50                       # SES limit per message
+UNDISCLOSED    = "undisclosed-recipients:;"  # MIME To: of a multi-recipient mail (RFC 5322 group)
+QUERY_FIELDS = "#t, comments, s3_pdf_path, card_id"    # only what we read (#t = title)
 
 # ── AWS clients ─────────────────────────────────────────────────────
-ses = boto3.client("ses",  region_name=REGION)
-s3  = boto3.client("s3",   region_name=REGION)
-ddb = boto3.resource("dynamodb", region_name=REGION).Table(TABLE_NAME)
+_POOL = ThreadPoolExecutor(max_workers=4)   # overlaps S3 + DynamoDB; reused when warm
+# built once per container; keep-alive pools are reused by warm invocations
+CFG = Config(tcp_keepalive=True, max_pool_connections=10,
+             retries={"mode": "standard", "total_max_attempts": 3})
+
+ses = SESSION.client("sesv2", config=CFG)
+s3  = SESSION.client("s3",    config=CFG)
+# low-level client: items stay raw AttributeValues, no TypeSerializer/Deserializer pass
+ddb_client = SESSION.client("dynamodb", config=CFG)
+
+
+def _prewarm() -> None:
+    """Open the SES / S3 / DynamoDB connections during INIT so the first mail reuses
+    them. Read-only calls, run side by side; any failure (IAM, network) is ignored."""
+    calls = (ses.get_account,
+             lambda: s3.head_bucket(Bucket=BUCKET_NAME),
+             lambda: ddb_client.describe_table(TableName=TABLE_NAME))
+    futures = [_POOL.submit(c) for c in calls]
+    wait(futures, timeout=3)
+    for f in futures:
+        if f.done() and f.exception():
+            print("⚠️ prewarm:", f.exception())
+
+if os.getenv("AWS_LAMBDA_FUNCTION_NAME"):      # only inside Lambda, not on import elsewhere
+    _prewarm()
 
 # ── util ------------------------------------------------------------
-def latest_pdf_key(project_id: str) -> Optional[str]:
+def project_pdf_key(project_id: str) -> Optional[str]:
+    """Newest Acta PDF under actas/<project>/ – a single ListObjectsV2 call."""
+    # Delimiter: immediate children only – nothing below actas/<project>/<sub>/ is sent back
+    resp = s3.list_objects_v2(Bucket=BUCKET_NAME, Prefix=f"actas/{project_id}/",
+                              Delimiter="/", MaxKeys=1000)
+    pdfs = [o for o in resp.get("Contents", []) if o["Key"].lower().endswith(".pdf")]
+    return max(pdfs, key=lambda o: o["LastModified"])["Key"] if pdfs else None
+
+def legacy_pdf_key(project_id: str) -> Optional[str]:
+    """Newest flat-layout Acta (actas/Acta_<name>_<project>.pdf) – paginated scan,
+    only for projects with neither an actas/<project>/ PDF nor a stored path."""
     paginator = s3.get_paginator("list_objects_v2")
     newest_key, newest_ts = None, 0
-    for page in paginator.paginate(Bucket=BUCKET_NAME, Prefix="actas/"):
+    for page in paginator.paginate(Bucket=BUCKET_NAME, Prefix="actas/Acta_", Delimiter="/"):
         for obj in page.get("Contents", []):
             key = obj["Key"]
             if key.lower().endswith(f"_{project_id}.pdf") \
@@ -58,39 +117,43 @@ def latest_pdf_key(project_id: str) -> Optional[str]:
                 newest_key, newest_ts = key, obj["LastModified"].timestamp()
     return newest_key
 
-# ── HTML builder (anchor-link version) ──────────────────────────────
-def build_html(project: str,
-               approve_url: str,
-               reject_url: str,
-               preview: Optional[str]) -> str:
-    """
-    Returns the complete HTML e-mail body.
-
-    * Uses semantic <a> “buttons” instead of <form> + <button>.
-    * JS rewrites the two hrefs to append the URL-encoded comment, so
-      /approve?token=…&status=approved&comment=…
-      works exactly like before.
-    * If the recipient leaves the comment blank the URLs stay as-is.
-    """
-    BRAND = BRAND_CLR
-
-    btn_css = (
-        "display:inline-block;padding:12px 28px;margin:0 6px;"
-        "border-radius:4px;font-size:16px;font-family:Arial,Helvetica,sans-serif;"
-        "color:#fff;text-decoration:none;"
-    )
-
-    preview_block = (
-        f"""<tr><td style="padding-top:22px">
-              <div style="border:1px solid #e0e0e0;border-left:4px solid {BRAND};
-                          background:#222;color:#f1f1f1;padding:14px;font-size:14px;">
-                <strong>Last comment</strong><br>{preview}
-              </div>
-            </td></tr>"""
-        if preview else ""
-    )
-
-    return f"""\
+_PDF_CACHE: Dict[str, tuple] = {}        # key → (ETag, bytes); one entry, warm starts only
+
+def fetch_pdf(key: str) -> Optional[bytes]:
+    """Acta bytes; a repeat send of an unchanged PDF is served from the warm container.
+    None if the Acta is over PDF_LINK_MIN – the caller links it instead."""
+    head   = s3.head_object(Bucket=BUCKET_NAME, Key=key)
+    if head.get("ContentLength", 0) > PDF_LINK_MIN:
+        return None
+    etag   = head["ETag"]
+    cached = _PDF_CACHE.get(key)
+    if cached and cached[0] == etag:
+        return cached[1]
+    # streamed in chunks; Actas above PDF_SPOOL_MAX spill to /tmp while downloading
+    with SpooledTemporaryFile(max_size=PDF_SPOOL_MAX) as buf:
+        s3.download_fileobj(BUCKET_NAME, key, buf)
+        buf.seek(0)
+        data = buf.read()
+    _PDF_CACHE.clear()                       # keep one entry → bounded memory
+    if len(data) <= PDF_CACHE_MAX:
+        _PDF_CACHE[key] = (etag, data)
+    return data
+
+# ── HTML templates (compiled once at import; substitute per mail) ───
+BTN_CSS = (
+    "display:inline-block;padding:12px 28px;margin:0 6px;"
+    "border-radius:4px;font-size:16px;font-family:Arial,Helvetica,sans-serif;"
+    "color:#fff;text-decoration:none;"
+)
+
+PREVIEW_TMPL = Template("""<tr><td style="padding-top:22px">
+    <div style="border:1px solid #e0e0e0;border-left:4px solid ${BRAND};
+                background:#222;color:#f1f1f1;padding:14px;font-size:14px;">
+      <strong>Last comment</strong><br>${preview}
+    </div>
+</td></tr>""")
+
+HTML_TMPL = Template("""\
 <!DOCTYPE html>
 <html>
   <body style="margin:0;padding:0;background:#f5f5f5">
@@ -100,16 +163,16 @@ def build_html(project: str,
              style="border:1px solid #ddd;border-radius:6px;background:#000;color:#f1f1f1;
                     font-family:Arial,Helvetica,sans-serif">
         <!-- header ---------------------------------------------------- -->
-        <tr><td style="background:{BRAND};padding:24px;font-size:22px">
+        <tr><td style="background:${BRAND};padding:24px;font-size:22px">
             Project Acta ready for review
         </td></tr>
 
         <!-- intro ------------------------------------------------------ -->
         <tr><td style="padding:24px;font-size:15px;line-height:22px">
-            Please review the attached Acta for <b>{project}</b> and choose an option.
+            Please review ${acta_ref} for <b>${project}</b> and choose an option.
         </td></tr>
 
-        {preview_block}
+        ${preview_block}
 
         <!-- optional comment field ------------------------------------ -->
         <tr><td style="padding:0 24px 18px 24px">
@@ -122,12 +185,12 @@ def build_html(project: str,
         <!-- buttons (anchor links) ------------------------------------ -->
         <tr><td align="center" style="padding-bottom:32px">
           <a id="approve"
-             href="{approve_url}"
-             style="{btn_css}background:{BRAND};">Approve</a>
+             href="${approve_url}"
+             style="${btn_css}background:${BRAND};">Approve</a>
 
           <a id="reject"
-             href="{reject_url}"
-             style="{btn_css}background:#d9534f;">Reject</a>
+             href="${reject_url}"
+             style="${btn_css}background:#d9534f;">Reject</a>
         </td></tr>
 
         <!-- tiny inline script -- rewrites href when comment changes -->
@@ -138,11 +201,11 @@ def build_html(project: str,
           const baseOK  = approve.href;
           const baseNO  = reject.href;
 
-          function upd() {{
+          function upd() {
               const txt = encodeURIComponent(box.value.trim());
               approve.href = txt ? baseOK + '&comment=' + txt : baseOK;
               reject.href  = txt ? baseNO + '&comment=' + txt : baseNO;
-          }}
+          }
           box.addEventListener('input', upd);
         </script>
 
@@ -154,89 +217,282 @@ def build_html(project: str,
     </td></tr>
   </table>
   </body>
-</html>"""
+</html>""")
+
+# bake the static holes in once → per mail only the dynamic fields are substituted
+_STATIC      = {"BRAND": BRAND_CLR, "btn_css": BTN_CSS}
+PREVIEW_TMPL = Template(PREVIEW_TMPL.safe_substitute(_STATIC))
+HTML_TMPL    = Template(HTML_TMPL.safe_substitute(_STATIC))
+
+
+# ── HTML builder (anchor-link version) ──────────────────────────────
+def build_html(project: str,
+               approve_url: str,
+               reject_url: str,
+               preview: Optional[str],
+               pdf_url: Optional[str] = None) -> str:
+    """
+    Returns the complete HTML e-mail body.
+
+    * Uses semantic <a> “buttons” instead of <form> + <button>.
+    * JS rewrites the two hrefs to append the URL-encoded comment, so
+      /approve?token=…&status=approved&comment=…
+      works exactly like before.
+    * If the recipient leaves the comment blank the URLs stay as-is.
+    * pdf_url (large Actas) turns "the attached Acta" into a download link.
+    * Project id, URLs and the last comment are HTML-escaped.
+    """
+    # project id and comment are user-controlled → escaped before they reach the markup
+    preview_block = (
+        PREVIEW_TMPL.substitute(preview=html_escape(preview))
+        if preview else ""
+    )
+    acta_ref = (f'<a href="{html_escape(pdf_url)}" style="color:{BRAND_CLR}">the Acta</a>'
+                if pdf_url else "the attached Acta")
+    return HTML_TMPL.substitute(
+        acta_ref=acta_ref,
+        project=html_escape(project),
+        approve_url=html_escape(approve_url),
+        reject_url=html_escape(reject_url),
+        preview_block=preview_block,
+    )
+
+
+# ── raw MIME (hand-assembled; EmailMessage only as fallback) ───────
+TEXT_BODY = "Please view this e-mail in HTML."
+
+_MIME_HEAD = (
+    "From: {sender}\r\nTo: {to}\r\nSubject: {subject}\r\nMIME-Version: 1.0\r\n"
+    'Content-Type: multipart/mixed; boundary="{b}mix"\r\n\r\n'
+    "--{b}mix\r\n"
+    'Content-Type: multipart/alternative; boundary="{b}alt"\r\n\r\n'
+    "--{b}alt\r\n"
+    'Content-Type: text/plain; charset="utf-8"\r\nContent-Transfer-Encoding: 7bit\r\n\r\n'
+    + TEXT_BODY + "\r\n"
+    "--{b}alt\r\n"
+    'Content-Type: text/html; charset="utf-8"\r\nContent-Transfer-Encoding: quoted-printable\r\n\r\n'
+)
+_MIME_ATTACH = (
+    "\r\n--{b}alt--\r\n"
+    "--{b}mix\r\n"
+    'Content-Type: {ctype}; name="{fname}"\r\nContent-Transfer-Encoding: base64\r\n'
+    'Content-Disposition: attachment; filename="{fname}"\r\n\r\n'
+)
+_MIME_TAIL = "\r\n--{b}mix--\r\n"
+_PLAIN_HDR = re.compile(r"^[\x20-\x7e]*$")        # printable ASCII, no CR/LF
+
+
+def _b64(data: bytes) -> bytes:
+    # C-level base64 in 76-char lines, CRLF-terminated as MIME expects
+    return base64.encodebytes(data).replace(b"\n", b"\r\n")
+
+
+def _qp(text: str) -> bytes:
+    # mostly-ASCII HTML: quoted-printable (C binascii) stays ~1:1 where base64 adds a third
+    text = text.replace("\r\n", "\n").replace("\r", "\n")
+    return binascii.b2a_qp(text.encode(), istext=True).replace(b"\n", b"\r\n")
+
+
+def _build_raw(to: str, subject: str, html: str, pdf: bytes,
+               ctype: str, fname: str) -> bytes:
+    b = f"=_acta_{os.urandom(8).hex()}_"          # "=_" never occurs in base64 / the bodies
+    return b"".join((
+        _MIME_HEAD.format(sender=EMAIL_SOURCE, to=to, b=b,
+                          subject=Header(subject, "utf-8").encode(linesep="\r\n")).encode(),
+        _qp(html),
+        _MIME_ATTACH.format(b=b, ctype=ctype, fname=fname).encode(),
+        _b64(pdf),
+        _MIME_TAIL.format(b=b).encode(),
+    ))
+
+
+@functools.lru_cache(maxsize=1)
+def _base_msg():
+    """Static part of the fallback mail (From + text/html alternative tree), built once;
+    email.message is only imported if it is needed."""
+    import email.policy
+    from email.message import EmailMessage
+    msg = EmailMessage(policy=email.policy.SMTP)
+    msg["From"] = EMAIL_SOURCE
+    msg.set_content(TEXT_BODY)
+    msg.add_alternative("", subtype="html")  # payload swapped in per mail
+    return msg
+
+
+def _build_msg(to: str, subject: str, html: str, pdf: bytes,
+               ctype: str, fname: str) -> bytes:
+    msg = copy.deepcopy(_base_msg())         # shallow copy would share the header list
+    msg["Subject"] = subject
+    msg["To"]      = to
+    msg.get_payload()[1].set_content(html, subtype="html")
+    maintype, subtype = ctype.split("/")
+    msg.add_attachment(pdf, maintype=maintype, subtype=subtype, filename=fname)
+    return msg.as_bytes()
+
+
+def compose_raw(to: str, subject: str, html: str, pdf: bytes,
+                ctype: str, fname: str) -> bytes:
+    """Hand-built MIME when every header value is plain ASCII, EmailMessage otherwise."""
+    plain = all(_PLAIN_HDR.match(v) for v in (EMAIL_SOURCE, to, fname)) and '"' not in fname
+    return (_build_raw if plain else _build_msg)(to, subject, html, pdf, ctype, fname)
 
 
 # ── Lambda handler ─────────────────────────────────────────────────
 def lambda_handler(event: Dict[str, Any], _ctx):
     # 1. Parse payload
     try:
-        payload = json.loads(event["body"]) if isinstance(event.get("body"), str) else event
+        raw = event.get("body")
+        if isinstance(raw, str):
+            if event.get("isBase64Encoded"):  # API Gateway binary / proxy bodies
+                raw = base64.b64decode(raw)
+            payload = _loads(raw)
+        else:
+            payload = event
         project_id = payload["project_id"]
         recipient  = payload["recipient"]
     except Exception as e:
         return {"statusCode": 400, "body": f"Missing / malformed body: {e}"}
 
-    # 2. Query DynamoDB
-    resp  = ddb.query(KeyConditionExpression=Key("project_id").eq(project_id),
-                      ScanIndexForward=False, Limit=25)
-    items = resp.get("Items", [])
+    # one address, a comma-separated string or a list → one SES call for all of them
+    recipients = ([r.strip() for r in recipient.split(",")] if isinstance(recipient, str)
+                  else [str(r).strip() for r in recipient])
+    recipients = [r for r in recipients if r]
+    if not recipients or len(recipients) > MAX_RECIPIENTS:
+        return {"statusCode": 400,
+                "body": f"recipient must hold 1–{MAX_RECIPIENTS} addresses"}
+
+    # 2. Query DynamoDB – the S3 listing runs alongside
+    f_list = _POOL.submit(project_pdf_key, project_id)    # one list call, never the flat scan
+    # Client_Email row filtered server-side → only that row crosses the wire
+    pid_av = {"S": str(project_id)}
+    # Limit applies before the filter, so page on until a match instead of capping it;
+    # a partition over 1 MB would otherwise hide the row behind LastEvaluatedKey
+    items, start = [], {}
+    while not items:
+        resp  = ddb_client.query(
+            TableName=TABLE_NAME,
+            KeyConditionExpression="project_id = :pid",
+            FilterExpression="#t = :ce",
+            ProjectionExpression=QUERY_FIELDS,
+            ExpressionAttributeNames={"#t": "title"},
+            ExpressionAttributeValues={":pid": pid_av, ":ce": {"S": "Client_Email"}},
+            ScanIndexForward=False,           # newest first → the current Client_Email card
+            **start)
+        items = resp.get("Items", [])
+        if "LastEvaluatedKey" not in resp:
+            break
+        start = {"ExclusiveStartKey": resp["LastEvaluatedKey"]}
+    if not items:                             # no Client_Email card → newest rows, as before
+        items = ddb_client.query(
+            TableName=TABLE_NAME,
+            KeyConditionExpression="project_id = :pid",
+            ProjectionExpression=QUERY_FIELDS,
+            ExpressionAttributeNames={"#t": "title"},
+            ExpressionAttributeValues={":pid": pid_av},
+            ScanIndexForward=False, Limit=25).get("Items", [])
     if not items:
         return {"statusCode": 404, "body": "Project not found in DynamoDB"}
 
-    client_rows = [i for i in items if i.get("title") == "Client_Email"]
-    card_row    = client_rows[0] if client_rows else items[0]
-
-    comment_raw = card_row.get("comments", [])
-    if isinstance(comment_raw, list) and comment_raw:
-        first = comment_raw[0]
-        last_comment = first.get("text", "")[:250] if isinstance(first, dict) else str(first)[:250]
-    elif isinstance(comment_raw, str):
-        last_comment = comment_raw[:250]
+    # one pass: first Client_Email row + first stored PDF path, stop once both are known
+    card_row = any_pdf = None
+    for i in items:
+        if card_row is None and i.get("title", {}).get("S") == "Client_Email":
+            card_row = i
+        if any_pdf is None:
+            any_pdf = i.get("s3_pdf_path", {}).get("S")
+        if card_row is not None and any_pdf:
+            break
+    card_row = card_row or items[0]
+
+    # comments: list of {"text": …} maps or plain strings, or a single string
+    comment_av = card_row.get("comments", {})
+    if comment_av.get("L"):
+        first = comment_av["L"][0]
+        text  = first["M"].get("text", {}).get("S", "") if "M" in first \
+                else first.get("S") or first.get("N") or ""
+        last_comment = text[:250]
+    elif "S" in comment_av:
+        last_comment = comment_av["S"][:250]
     else:
         last_comment = None
 
     # 3. Locate PDF
-    pdf_key = card_row.get("s3_pdf_path") or latest_pdf_key(project_id)
+    # a PDF under actas/<project>/ is what lambda_handler uploads today → it beats a stored
+    # s3_pdf_path, which may name an older flat-layout key or a pre-rename project name
+    try:
+        listed = f_list.result()
+    except ClientError as e:                  # a stored path still works without the listing
+        print("⚠️ Acta listing failed:", e)
+        listed = None
+    pdf_key = listed or card_row.get("s3_pdf_path", {}).get("S") or any_pdf
+    if not pdf_key:                           # flat-layout project, never mailed with a path
+        pdf_key = legacy_pdf_key(project_id)
     if not pdf_key:
         return {"statusCode": 500, "body": "Could not locate Acta PDF"}
 
+    # 4. Fetch the PDF before the token is replaced: a failed fetch must leave the
+    #    previous mail's links (and any decision already taken) untouched
     try:
-        pdf_bytes = s3.get_object(Bucket=BUCKET_NAME, Key=pdf_key)["Body"].read()
+        pdf_bytes = fetch_pdf(pdf_key)
     except ClientError as e:
         return {"statusCode": 500,
                 "body": f"S3 fetch failed: {e.response['Error']['Message']}"}
 
-    maintype, subtype = (mimetypes.guess_type(pdf_key)[0] or "application/pdf").split("/")
-
-    # 4. Persist approval token
-    token   = str(uuid.uuid4())
+    # 5. Persist approval token – runs while the mail is built, awaited before the send
+    token   = os.urandom(16).hex()        # 128-bit, URL-safe hex
     sent_ts = datetime.utcnow().isoformat() + "Z"
-    ddb.update_item(
-        Key={"project_id": project_id, "card_id": card_row["card_id"]},
-        UpdateExpression=("SET approval_token=:t, approval_status=:s, "
-                          "sent_timestamp=:ts, approval_sent_timestamp=:ts"),
-        ExpressionAttributeValues={":t": token, ":s": "pending", ":ts": sent_ts}
+    update  = ("SET approval_token=:t, approval_status=:s, "
+               "sent_timestamp=:ts, approval_sent_timestamp=:ts")
+    values  = {":t": {"S": token}, ":s": {"S": "pending"}, ":ts": {"S": sent_ts}}
+    f_upd = _POOL.submit(
+        ddb_client.update_item,                # types known → no TypeSerializer pass
+        TableName=TABLE_NAME,
+        Key={"project_id": pid_av, "card_id": card_row["card_id"]},
+        UpdateExpression=update,
+        ExpressionAttributeValues=values,
+        ReturnValues="NONE"
     )
 
-    # 5. Build URLs ─────────────────────────────────────────────
-    q           = urllib.parse.quote_plus(token)
-    approve_url = f"{API_BASE}?token={q}&status=approved"
-    reject_url  = f"{API_BASE}?token={q}&status=rejected"
-
-    # 6. Compose & send email ──────────────────────────────────
-    msg = EmailMessage()
-    msg["Subject"] = f"Action required – Acta {project_id}"
-    msg["From"]    = EMAIL_SOURCE
-    msg["To"]      = recipient
-    msg.set_content("Please view this e-mail in HTML.")
-
-    msg.add_alternative(
-        build_html(project_id, approve_url, reject_url, last_comment),
-        subtype="html"
-    )
-    msg.add_attachment(
-        pdf_bytes,
-        maintype=maintype,
-        subtype=subtype,
-        filename=os.path.basename(pdf_key)
-    )
+    # 6. Build URLs + mail ──────────────────────────────────────
+    # several recipients go out as Bcc behind an empty group: nobody sees the other
+    # addresses and the To: line stays short however many there are
+    if len(recipients) == 1:
+        mime_to, destination = recipients[0], {"ToAddresses": recipients}
+    else:
+        mime_to, destination = UNDISCLOSED, {"BccAddresses": recipients}
+    approve_url = APPROVE_URL.format(token)   # hex token: already URL-safe, no quoting
+    reject_url  = REJECT_URL.format(token)
+    subject     = f"Action required – Acta {project_id}"
+    if pdf_bytes is None:                     # large Acta: link it, SES builds the MIME
+        pdf_url = s3.generate_presigned_url(  # signed locally, no S3 round-trip
+            "get_object", Params={"Bucket": BUCKET_NAME, "Key": pdf_key},
+            ExpiresIn=PDF_LINK_TTL)
+        html    = build_html(project_id, approve_url, reject_url, last_comment, pdf_url)
+        content = {"Simple": {
+            "Subject": {"Data": subject, "Charset": "UTF-8"},
+            "Body": {"Text": {"Data": TEXT_BODY, "Charset": "UTF-8"},
+                     "Html": {"Data": html, "Charset": "UTF-8"}}}}
+    else:
+        # keys come from the .pdf listing or s3_pdf_path; anything else is opaque bytes
+        ctype = PDF_TYPE if pdf_key.lower().endswith(".pdf") else OCTET_TYPE
+        content = {"Raw": {"Data": compose_raw(   # SES v2: raw MIME, serialised once
+            mime_to, subject,
+            build_html(project_id, approve_url, reject_url, last_comment),
+            pdf_bytes, ctype, os.path.basename(pdf_key))}}
+
+    # the links only work once the token is stored
+    try:
+        f_upd.result()
+    except ClientError as e:
+        return {"statusCode": 500,
+                "body": f"DynamoDB update failed: {e.response['Error']['Message']}"}
 
+    # 7. Send ──────────────────────────────────────────────────
     try:
-        ses.send_raw_email(
-            Source=EMAIL_SOURCE,
-            Destinations=[recipient],
-            RawMessage={"Data": msg.as_bytes()}
+        ses.send_email(
+            FromEmailAddress=EMAIL_SOURCE,
+            Destination=destination,
+            Content=content
         )
     except ClientError as e:
         return {
@@ -1,13 +1,16 @@
 import os
 import json
+import functools
 import time
 import logging
 import requests
+import ijson
+import orjson
 import ast
 import pandas as pd
-import numpy as np
 from datetime import datetime
 import subprocess  # <-- For running LibreOffice headless
+from concurrent.futures import ThreadPoolExecutor
 
 
 # ----------------------------------------------------------------------------
@@ -27,7 +30,10 @@ def safe_parse_due(due_val):
     except Exception:
         return str(due_val)
 import boto3
+from botocore.config import Config
 from botocore.exceptions import ClientError
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from docx import Document
 from docx.shared import Pt, Inches, RGBColor
 from docx.enum.section import WD_ORIENT
@@ -52,7 +58,10 @@ OUTPUT_EXCEL = "/tmp/Acta_de_Seguimiento.xlsx"
 
 # Environment Variables
 DYNAMO_TABLE = os.getenv("DYNAMODB_TABLE_NAME", "ProjectPlace_DataExtrator_landing_table_v3")
+DYNAMO_WRITE_ATTEMPTS = 6  # BatchWriteItem tries per 25-item chunk before giving up
 S3_BUCKET = os.getenv("S3_BUCKET_NAME", "projectplace-dv-2025-x9a7b")
+FETCH_CONCURRENCY = int(os.getenv("FETCH_CONCURRENCY", "8"))  # projects fetched in parallel
+COMMENTS_CONCURRENCY = int(os.getenv("COMMENTS_CONCURRENCY", "16"))  # comment GETs in flight
 
 # BRAND_COLOR_HEADER changed from #2E86C1 → #4AC795
 BRAND_COLOR_HEADER = "4AC795"
@@ -61,6 +70,17 @@ LIGHT_SHADE_2X2 = "FAFAFA"
 # Location for your logo image. Make sure it's included in your Docker image.
 LOGO_IMAGE_PATH = os.path.join(os.path.dirname(__file__), "logo", "company_logo.png")
 
+# One keep-alive session for every ProjectPlace call (reused across warm starts)
+_SESSION = requests.Session()
+_SESSION.mount("https://", HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=32,
+    max_retries=Retry(total=5, backoff_factor=0.3, status_forcelist=[429, 500, 502, 503, 504]),
+))
+
+# Shared by all project workers (separate from the project pool so they never wait on themselves)
+_COMMENTS_POOL = ThreadPoolExecutor(max_workers=COMMENTS_CONCURRENCY)
+
 
 def lambda_handler(event, context):
     """
@@ -143,8 +163,9 @@ def lambda_handler(event, context):
         try:
             pdf_path = convert_docx_to_pdf(doc_path)
             if pdf_path:
-                # e.g. "actas/Acta_ProjectName_1234.pdf"
-                s3_key_pdf = f"actas/Acta_{safe_proj}_{pid}.pdf"
+                # e.g. "actas/1234/Acta_ProjectName_1234.pdf" – one prefix per project,
+                # so the approval mailer finds it with a single ListObjectsV2 call
+                s3_key_pdf = f"actas/{pid}/Acta_{safe_proj}_{pid}.pdf"
                 upload_file_to_s3(pdf_path, s3_key_pdf)
         except Exception as exc:
             logger.error(f"PDF conversion failed for doc {doc_path}: {exc}")
@@ -163,16 +184,30 @@ def lambda_handler(event, context):
 # ----------------------------------------------------------------------------
 # 1) SECRETS & OAUTH
 # ----------------------------------------------------------------------------
+# AWS clients are built once per container and reused by warm invocations
+_AWS_CFG = Config(max_pool_connections=64, tcp_keepalive=True)
+_SECRETS = boto3.client("secretsmanager", region_name=REGION, config=_AWS_CFG)
+_DDB = boto3.client("dynamodb", region_name=REGION, config=_AWS_CFG)
+_S3 = boto3.client("s3", region_name=REGION, config=_AWS_CFG)
+_SECRET_CACHE = {}                          # parsed SecretString, reused by warm invocations
+_TOKEN_CACHE = {"token": None, "exp": 0}    # bearer token + expiry (epoch seconds)
+
 def load_secrets():
-    sm = boto3.client("secretsmanager", region_name=REGION)
+    if _SECRET_CACHE:
+        return _SECRET_CACHE
     try:
-        resp = sm.get_secret_value(SecretId=SECRET_NAME)
-        return json.loads(resp["SecretString"])
+        resp = _SECRETS.get_secret_value(SecretId=SECRET_NAME)
+        _SECRET_CACHE.update(json.loads(resp["SecretString"]))
+        return _SECRET_CACHE
     except ClientError as e:
         logger.error(f"Secrets error: {str(e)}")
         return {}
 
 def get_robot_access_token(client_id, client_secret):
+    # Reuse the token until 60 s before it expires
+    if _TOKEN_CACHE["token"] and time.time() < _TOKEN_CACHE["exp"] - 60:
+        return _TOKEN_CACHE["token"]
+
     url = f"{PROJECTPLACE_API_URL}/oauth2/access_token"
     data = {
         "grant_type": "client_credentials",
@@ -180,9 +215,14 @@ def get_robot_access_token(client_id, client_secret):
         "client_secret": client_secret
     }
     try:
-        resp = requests.post(url, data=data)
+        resp = _SESSION.post(url, data=data)
         resp.raise_for_status()
-        return resp.json().get("access_token")
+        body = resp.json()
+        token = body.get("access_token")
+        if token:
+            _TOKEN_CACHE["token"] = token
+            _TOKEN_CACHE["exp"] = time.time() + int(body.get("expires_in", 0))
+        return token
     except requests.exceptions.RequestException as e:
         logger.error(f"Token fetch error: {str(e)}")
         return None
@@ -190,24 +230,31 @@ def get_robot_access_token(client_id, client_secret):
 # ----------------------------------------------------------------------------
 # 2) ENTERPRISE PROJECTS
 # ----------------------------------------------------------------------------
+@functools.lru_cache(maxsize=1)
+def auth_headers(token):
+    """One shared headers dict per token; gzip keeps large card lists small on the wire."""
+    return {
+        "Authorization": f"Bearer {token}",
+        "Accept": "application/json",
+        "Accept-Encoding": "gzip",
+    }
+
+
 def get_all_account_projects(token, include_archived=False):
     """
     Calls /1/account/projects to list projects for the entire enterprise.
     If include_archived=False, skip archived.
     """
     url = f"{PROJECTPLACE_API_URL}/1/account/projects"
-    headers = {
-        "Authorization": f"Bearer {token}",
-        "Content-Type": "application/json"
-    }
+    headers = auth_headers(token)
     params = {}
     if include_archived:
         params["include_archived"] = 1
 
     try:
-        r = requests.get(url, headers=headers, params=params)
+        r = _SESSION.get(url, headers=headers, params=params)
         r.raise_for_status()
-        data = r.json()
+        data = orjson.loads(r.content)
         if not isinstance(data, dict):
             logger.warning(f"Projects response not dict: {type(data)} => {data}")
             return []
@@ -237,42 +284,10 @@ def generate_excel_report(token, projects):
         logger.warning("No projects provided to generate_excel_report.")
         return None
 
-    all_cards = []
-    headers = {"Authorization": f"Bearer {token}", "Accept": "application/json"}
-
-    for project_info in projects:
-        pid = str(project_info.get("id"))
-        p_name = project_info.get("name", "Unnamed Project")
-        cards_url = f"{PROJECTPLACE_API_URL}/1/projects/{pid}/cards"
-
-        try:
-            resp = requests.get(cards_url, headers=headers)
-            resp.raise_for_status()
-            cards = resp.json()
-            for c in cards:
-                row = dict(c)
-                cid = c.get("id")
-
-                cmts = fetch_comments_for_card(token, cid)
-                # Capture label_id
-                label_val = None
-                if "label_id" in c:
-                    label_val = c.get("label_id")
-                elif isinstance(c.get("labels"), list) and c["labels"]:
-                    label_val = c["labels"][0].get("id")
-                row["label_id"] = label_val
-                row["Comments"] = str(cmts)
-
-                row["project_id"] = pid
-                row["project_name"] = p_name
-                row["archived"] = project_info.get("archived", False)
-
-                all_cards.append(row)
-
-            logger.info(f"Fetched {len(cards)} cards from project '{p_name}' ({pid}).")
-
-        except Exception as e:
-            logger.error(f"Error fetching cards for project {pid}: {str(e)}")
+    # Projects are independent -> fetch them concurrently (order preserved by map)
+    with ThreadPoolExecutor(max_workers=FETCH_CONCURRENCY) as ex:
+        per_project = ex.map(lambda p: fetch_cards_for_project(token, p), projects)
+        all_cards = [row for rows in per_project for row in rows]
 
     if not all_cards:
         logger.warning("No cards found across all projects.")
@@ -284,16 +299,71 @@ def generate_excel_report(token, projects):
     return OUTPUT_EXCEL
 
 
+def fetch_cards_stream(url, headers):
+    """Yield cards one at a time while the response body is still arriving."""
+    with _SESSION.get(url, headers=headers, stream=True) as resp:
+        resp.raise_for_status()
+        resp.raw.decode_content = True  # let urllib3 undo gzip before ijson reads
+        yield from ijson.items(resp.raw, "item", use_float=True)
+
+
+def _collect(it, sink):
+    """Pass items through while keeping a reference to each one in sink."""
+    for x in it:
+        sink.append(x)
+        yield x
+
+
+def fetch_cards_for_project(token, project_info):
+    """Return one Excel row per card (with comments) for a single project."""
+    pid = str(project_info.get("id"))
+    p_name = project_info.get("name", "Unnamed Project")
+    cards_url = f"{PROJECTPLACE_API_URL}/1/projects/{pid}/cards"
+    headers = auth_headers(token)
+    rows = []
+
+    try:
+        # Comment GETs are submitted as each card is parsed, overlapping the body download
+        cards = []
+        comments = _COMMENTS_POOL.map(
+            lambda c: fetch_comments_for_card(token, c.get("id")),
+            _collect(fetch_cards_stream(cards_url, headers), cards))
+        for c, cmts in zip(cards, comments):
+            row = dict(c)
+
+            # Capture label_id
+            label_val = None
+            if "label_id" in c:
+                label_val = c.get("label_id")
+            elif isinstance(c.get("labels"), list) and c["labels"]:
+                label_val = c["labels"][0].get("id")
+            row["label_id"] = label_val
+            row["creator_name"] = (c.get("creator") or {}).get("name") or "N/A"
+            row["Comments"] = str(cmts)
+
+            row["project_id"] = pid
+            row["project_name"] = p_name
+            row["archived"] = project_info.get("archived", False)
+
+            rows.append(row)
+
+        logger.info(f"Fetched {len(rows)} cards from project '{p_name}' ({pid}).")
+
+    except Exception as e:
+        logger.error(f"Error fetching cards for project {pid}: {str(e)}")
+    return rows
+
+
 def fetch_comments_for_card(token, card_id):
     if not card_id:
         return []
     url = f"{PROJECTPLACE_API_URL}/1/cards/{card_id}/comments"
-    headers = {"Authorization": f"Bearer {token}", "Accept":"application/json"}
+    headers = auth_headers(token)
     out = []
     try:
-        r = requests.get(url, headers=headers)
+        r = _SESSION.get(url, headers=headers)
         r.raise_for_status()
-        for c in r.json():
+        for c in orjson.loads(r.content):
             out.append(c.get("text","N/A"))
     except Exception as e:
         logger.error(f"Failed to fetch comments for card {card_id}: {str(e)}")
@@ -305,23 +375,43 @@ def fetch_comments_for_card(token, card_id):
 def store_in_dynamodb(df):
     if df.empty:
         return
-    ddb = boto3.resource("dynamodb", region_name=REGION)
-    table = ddb.Table(DYNAMO_TABLE)
-    inserted = 0
+    ts = {"N": str(int(time.time()))}
+    # Keyed by (project_id, card_id): BatchWriteItem rejects duplicate keys in one request
+    items = {}
     for idx, row in df.iterrows():
         pid = row.get("project_id")
         if not pid or pd.isna(pid):
             continue
         item = {
-            "project_id": str(pid),
-            "card_id": str(row.get("id","N/A")),
-            "title": str(row.get("title","N/A")),
-                    "label_id": str(row.get("label_id","")),
-            "timestamp": int(time.time())
+            "project_id": {"S": str(pid)},
+            "card_id": {"S": str(row.get("id","N/A"))},
+            "title": {"S": str(row.get("title","N/A"))},
+            "label_id": {"S": str(row.get("label_id",""))},
+            "timestamp": ts
         }
-        table.put_item(Item=item)
-        inserted += 1
-    logger.info(f"Inserted {inserted} items into {DYNAMO_TABLE}")
+        items[(item["project_id"]["S"], item["card_id"]["S"])] = {"PutRequest": {"Item": item}}
+
+    puts = list(items.values())
+    if not puts:
+        logger.info("∅ no rows with a project_id – nothing to store")
+        return
+    for i in range(0, len(puts), 25):
+        pending = {DYNAMO_TABLE: puts[i:i + 25]}
+        backoff = 0.05
+        for _ in range(DYNAMO_WRITE_ATTEMPTS):
+            resp = _DDB.batch_write_item(RequestItems=pending)
+            pending = resp.get("UnprocessedItems") or {}
+            if not pending:
+                break
+            # Throttled: re-drive only what DynamoDB did not apply
+            time.sleep(backoff)
+            backoff = min(backoff * 2, 5)
+        if pending:
+            left = [r["PutRequest"]["Item"]["card_id"]["S"] for r in pending[DYNAMO_TABLE]]
+            logger.error(f"❌ {len(left)} items still unprocessed after "
+                         f"{DYNAMO_WRITE_ATTEMPTS} attempts (card_ids: {left})")
+            raise RuntimeError(f"DynamoDB kept throttling {DYNAMO_TABLE}: {len(left)} items unwritten")
+    logger.info(f"Inserted {len(puts)} items into {DYNAMO_TABLE}")
 
 
 # ----------------------------------------------------------------------------
@@ -338,9 +428,9 @@ def snippet_filter(df):
         df["project_id"] = df["project_dict"].apply(lambda p: p.get("id", None))
         df["project_name"] = df["project_dict"].apply(lambda p: p.get("name","Unknown Project"))
 
-    if "creator" in df.columns:
-        df["creator_dict"] = df["creator"].apply(parse_dict_column)
-        df["creator_name"] = df["creator_dict"].apply(lambda c: c.get("name","N/A"))
+    # creator_name is flattened at fetch time; no need to literal_eval the stringified dict
+    if "creator_name" in df.columns:
+        df["creator_name"] = df["creator_name"].fillna("N/A")
     else:
         df["creator_name"] = "N/A"
 
@@ -354,19 +444,29 @@ def snippet_filter(df):
     df = df[df["comments_parsed"].str.strip() != ""].copy()
     return df
 
+# what literal_eval raises on a malformed / non-literal cell
+_LITERAL_ERRORS = (ValueError, SyntaxError, TypeError, MemoryError, RecursionError)
+
 def parse_dict_column(raw_value):
+    if isinstance(raw_value, dict):          # in-memory frame: nothing to parse
+        return raw_value
+    if not isinstance(raw_value, str):       # NaN / numbers from Excel
+        return {}
     try:
-        return ast.literal_eval(str(raw_value))
-    except:
+        val = ast.literal_eval(raw_value)
+    except _LITERAL_ERRORS:
         return {}
+    return val if isinstance(val, dict) else {}
 
 def parse_last_comment(raw_value):
-    try:
-        arr = ast.literal_eval(str(raw_value))
-        if isinstance(arr, list) and len(arr) > 0:
-            return str(arr[-1])
-    except:
-        pass
+    arr = raw_value
+    if isinstance(raw_value, str):
+        try:
+            arr = ast.literal_eval(raw_value)
+        except _LITERAL_ERRORS:
+            return ""
+    if isinstance(arr, list) and len(arr) > 0:
+        return str(arr[-1])
     return ""
 
 def parse_wbs_id(wbs_str):
@@ -578,12 +678,11 @@ def upload_file_to_s3(file_path, s3_key):
     Upload with ContentType and ContentDisposition so that direct S3
     console downloads preserve the docx or xlsx properly.
     """
-    s3 = boto3.client("s3", region_name=REGION)
     content_type = infer_content_type(s3_key)
     disposition = f'attachment; filename="{os.path.basename(s3_key)}"'
 
     try:
-        s3.upload_file(
+        _S3.upload_file(
             Filename=file_path,
             Bucket=S3_BUCKET,
             Key=s3_key,
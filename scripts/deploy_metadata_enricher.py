@@ -21,10 +21,12 @@ try:
     ROLE_ARN     = f"arn:aws:iam::{ACCOUNT_ID}:role/ProjectplaceLambdaRole"
     ZIP_DIR      = "./deployment_zips"
     SRC_FILE     = "approval/project_metadata_enricher.py"
+    CORE_FILE    = "approval/enricher_core.py"          # shared helpers, zipped alongside
 
-    if not os.path.exists(SRC_FILE):
-        print(f"❌ ERROR: Lambda source file missing → {SRC_FILE}")
-        sys.exit(1)
+    for path in (SRC_FILE, CORE_FILE):
+        if not os.path.exists(path):
+            print(f"❌ ERROR: Lambda source file missing → {path}")
+            sys.exit(1)
 
     if os.path.exists(ZIP_DIR):
         shutil.rmtree(ZIP_DIR)
@@ -34,6 +36,7 @@ try:
     print(f"📦 Creating zip → {zip_path}")
     with zipfile.ZipFile(zip_path, "w") as z:
         z.write(SRC_FILE, arcname=os.path.basename(SRC_FILE))
+        z.write(CORE_FILE, arcname=os.path.basename(CORE_FILE))
 
     client = boto3.client("lambda", region_name=REGION)
     with open(zip_path, "rb") as f:
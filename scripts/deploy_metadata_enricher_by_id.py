@@ -1,5 +1,5 @@
 #!/usr/bin/env python3
-import os, zipfile, boto3, sys, shutil
+import os, json, time, zipfile, boto3, sys, shutil, subprocess
 
 def require_env(key):
     val = os.getenv(key)
@@ -8,6 +8,101 @@ def require_env(key):
         sys.exit(1)
     return val
 
+
+def deploy_function(client, name, handler, code, env_vars, timeout, drop=()):
+    """Update (or create) one function; env_vars are merged into the existing
+    environment so variables set outside this script survive a redeploy –
+    except the keys in `drop`, which this script owns and removes."""
+    try:
+        print(f"🔁 Updating {name} code...")
+        current = client.get_function(FunctionName=name)["Configuration"]
+        client.update_function_code(FunctionName=name, ZipFile=code)
+
+        print("⏳ Waiting for update to complete...")
+        client.get_waiter("function_updated").wait(FunctionName=name)
+
+        print(f"⚙️ Updating {name} environment...")
+        merged = {**current.get("Environment", {}).get("Variables", {}), **env_vars}
+        for key in drop:
+            merged.pop(key, None)
+        client.update_function_configuration(
+            FunctionName=name,
+            Environment={"Variables": merged},
+            Timeout=timeout
+        )
+        client.get_waiter("function_updated").wait(FunctionName=name)
+    except client.exceptions.ResourceNotFoundException:
+        print(f"🚀 Creating new Lambda function {name}...")
+        client.create_function(
+            FunctionName=name,
+            Runtime="python3.9",
+            Role=ROLE_ARN,
+            Handler=handler,
+            Code={"ZipFile": code},
+            Timeout=timeout,
+            MemorySize=256,
+            Publish=True,
+            Environment={"Variables": env_vars}
+        )
+        client.get_waiter("function_active_v2").wait(FunctionName=name)
+    return client.get_function(FunctionName=name)["Configuration"]["FunctionArn"]
+
+
+def ensure_queue(sqs, name, visibility):
+    """Fan-out queue + its dead-letter queue (poison messages stop after 5 receives)."""
+    dlq_url = sqs.create_queue(QueueName=f"{name}-dlq")["QueueUrl"]
+    dlq_arn = sqs.get_queue_attributes(
+        QueueUrl=dlq_url, AttributeNames=["QueueArn"])["Attributes"]["QueueArn"]
+    attrs = {"VisibilityTimeout": str(visibility),
+             "RedrivePolicy": json.dumps({"deadLetterTargetArn": dlq_arn, "maxReceiveCount": "5"})}
+    try:
+        url = sqs.get_queue_url(QueueName=name)["QueueUrl"]
+        sqs.set_queue_attributes(QueueUrl=url, Attributes=attrs)
+    except sqs.exceptions.QueueDoesNotExist:
+        url = sqs.create_queue(QueueName=name, Attributes=attrs)["QueueUrl"]
+    arn = sqs.get_queue_attributes(QueueUrl=url, AttributeNames=["QueueArn"])["Attributes"]["QueueArn"]
+    return url, arn
+
+
+def grant_queue_access(iam, role_name, queue_arn):
+    """Inline policy on the shared function role: the lister sends, the worker's event
+    source receives/deletes. Exits with the prerequisite if the deployer may not set it."""
+    policy = {"Version": "2012-10-17", "Statement": [{
+        "Effect": "Allow",
+        "Action": ["sqs:SendMessage", "sqs:ReceiveMessage", "sqs:DeleteMessage",
+                   "sqs:GetQueueAttributes", "sqs:ChangeMessageVisibility"],
+        "Resource": queue_arn}]}
+    try:
+        iam.put_role_policy(RoleName=role_name, PolicyName="enricherByIdFanoutQueue",
+                            PolicyDocument=json.dumps(policy))
+    except iam.exceptions.ClientError as e:
+        print(f"❌ Could not grant {role_name} access to {queue_arn}: {e}\n"
+              f"   Prerequisite: the deployer needs iam:PutRolePolicy on {role_name}, or the role "
+              f"must already allow {', '.join(policy['Statement'][0]['Action'])} on the queue.")
+        sys.exit(1)
+
+
+def ensure_mapping(client, queue_arn, function):
+    """SQS → worker event source; partial batch failures so only failed messages return.
+    Retried while a freshly granted role policy propagates through IAM."""
+    cfg = {"BatchSize": 10, "MaximumBatchingWindowInSeconds": 1,
+           "FunctionResponseTypes": ["ReportBatchItemFailures"]}
+    maps = client.list_event_source_mappings(
+        EventSourceArn=queue_arn, FunctionName=function)["EventSourceMappings"]
+    if maps:
+        client.update_event_source_mapping(UUID=maps[0]["UUID"], **cfg)
+        return
+    for attempt in range(6):
+        try:
+            client.create_event_source_mapping(EventSourceArn=queue_arn, FunctionName=function, **cfg)
+            return
+        except client.exceptions.InvalidParameterValueException as e:
+            if attempt == 5:
+                raise
+            print(f"⏳ Waiting for IAM to propagate ({e})")
+            time.sleep(10)
+
+
 print("🟢 STARTING deploy_metadata_enricher_by_id.py")
 
 try:
@@ -15,16 +110,23 @@ try:
     ACCOUNT_ID   = require_env("AWS_ACCOUNT_ID")
     TABLE_NAME   = require_env("DYNAMODB_ENRICHMENT_TABLE")
     SECRET_NAME  = require_env("SECRET_NAME")
+    QUEUE_NAME   = os.getenv("FANOUT_QUEUE_NAME", "")   # set → SQS fan-out + worker function
 
     FUNCTION     = "projectMetadataEnricherById"
     HANDLER      = "project_metadata_enricher_by_id.lambda_handler"
-    ROLE_ARN     = f"arn:aws:iam::{ACCOUNT_ID}:role/ProjectplaceLambdaRole"
+    WORKER       = f"{FUNCTION}Worker"                  # SQS consumer of the fan-out queue
+    WORKER_HANDLER = "project_metadata_enricher_by_id.sqs_handler"
+    TIMEOUT      = 300
+    ROLE_NAME    = "ProjectplaceLambdaRole"
+    ROLE_ARN     = f"arn:aws:iam::{ACCOUNT_ID}:role/{ROLE_NAME}"
     ZIP_DIR      = "./deployment_zips"
     SRC_FILE     = "approval/project_metadata_enricher_by_id.py"
+    CORE_FILE    = "approval/enricher_core.py"          # shared helpers, zipped alongside
 
-    if not os.path.exists(SRC_FILE):
-        print(f"❌ ERROR: Lambda source file missing → {SRC_FILE}")
-        sys.exit(1)
+    for path in (SRC_FILE, CORE_FILE):
+        if not os.path.exists(path):
+            print(f"❌ ERROR: Lambda source file missing → {path}")
+            sys.exit(1)
 
     if os.path.exists(ZIP_DIR):
         shutil.rmtree(ZIP_DIR)
@@ -32,8 +134,21 @@ try:
     os.makedirs(ZIP_DIR, exist_ok=True)
     zip_path = f"{ZIP_DIR}/{FUNCTION}.zip"
     print(f"📦 Creating zip → {zip_path}")
-    with zipfile.ZipFile(zip_path, "w") as z:
+    # orjson + ijson wheels for the python3.9 x86_64 runtime (the handler falls back to stdlib without them)
+    pkg_dir = f"{ZIP_DIR}/pkgs"
+    pip = subprocess.run([sys.executable, "-m", "pip", "install", "orjson", "ijson",
+                          "--target", pkg_dir, "--platform", "manylinux2014_x86_64",
+                          "--python-version", "3.9", "--only-binary=:all:", "--quiet"])
+    if pip.returncode:
+        print("⚠️ orjson/ijson not bundled – deploying with stdlib json")
+
+    with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as z:
         z.write(SRC_FILE, arcname=os.path.basename(SRC_FILE))
+        z.write(CORE_FILE, arcname=os.path.basename(CORE_FILE))
+        for root, _, files in os.walk(pkg_dir):
+            for name in files:
+                full = os.path.join(root, name)
+                z.write(full, arcname=os.path.relpath(full, pkg_dir))
 
     client = boto3.client("lambda", region_name=REGION)
     with open(zip_path, "rb") as f:
@@ -44,35 +159,20 @@ try:
         "SECRET_NAME": SECRET_NAME
     }
 
-    try:
-        print("🔁 Updating Lambda code...")
-        client.get_function(FunctionName=FUNCTION)
-        client.update_function_code(FunctionName=FUNCTION, ZipFile=zipped_code)
-
-        print("⏳ Waiting for update to complete...")
-        client.get_waiter("function_updated").wait(FunctionName=FUNCTION)
-
-        print("⚙️ Updating Lambda environment...")
-        client.update_function_configuration(
-            FunctionName=FUNCTION,
-            Environment={"Variables": env_vars},
-            Timeout=300
-        )
-    except client.exceptions.ResourceNotFoundException:
-        print("🚀 Creating new Lambda function...")
-        client.create_function(
-            FunctionName=FUNCTION,
-            Runtime="python3.9",
-            Role=ROLE_ARN,
-            Handler=HANDLER,
-            Code={"ZipFile": zipped_code},
-            Timeout=300,
-            MemorySize=256,
-            Publish=True,
-            Environment={"Variables": env_vars}
-        )
+    if QUEUE_NAME:
+        sqs = boto3.client("sqs", region_name=REGION)
+        # AWS guidance: visibility ≥ 6× the consumer timeout, so retries don't overlap
+        queue_url, queue_arn = ensure_queue(sqs, QUEUE_NAME, 6 * TIMEOUT)
+        print(f"📨 Fan-out queue → {queue_url}")
+        grant_queue_access(boto3.client("iam"), ROLE_NAME, queue_arn)
+        deploy_function(client, WORKER, WORKER_HANDLER, zipped_code, env_vars, TIMEOUT)
+        ensure_mapping(client, queue_arn, WORKER)
+        env_vars = {**env_vars, "FANOUT_QUEUE_URL": queue_url}
+        print(f"✅ Worker {WORKER} wired to {QUEUE_NAME} (ReportBatchItemFailures)")
 
-    arn = client.get_function(FunctionName=FUNCTION)["Configuration"]["FunctionArn"]
+    # without FANOUT_QUEUE_NAME fan-out is off: drop a FANOUT_QUEUE_URL left by an earlier deploy
+    arn = deploy_function(client, FUNCTION, HANDLER, zipped_code, env_vars, TIMEOUT,
+                          drop=() if QUEUE_NAME else ("FANOUT_QUEUE_URL",))
     print(f"✅ Lambda deployed → {arn}")
 
 except Exception as e:
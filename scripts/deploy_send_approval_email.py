@@ -5,6 +5,7 @@ deploy_send_approval_email.py
 • Builds a tiny ZIP containing approval/send_approval_email.py
 • Upserts the sendApprovalEmail Lambda (update if it exists,
   create if it doesn’t), and sets all required environment vars.
+• Runs on arm64 (Graviton) unless LAMBDA_ARCH=x86_64.
 """
 
 import os, sys, zipfile, shutil, boto3
@@ -29,6 +30,8 @@ EMAIL_SOURCE  = require_env("EMAIL_SOURCE")
 S3_BUCKET     = require_env("S3_BUCKET_NAME")
 API_ID        = require_env("ACTA_API_ID")
 ROLE_ARN      = f"arn:aws:iam::{ACCOUNT_ID}:role/ProjectplaceLambdaRole"
+ARCH          = os.getenv("LAMBDA_ARCH", "arm64")   # pure Python → Graviton is cheaper per GB-s
+MEMORY_MB     = 512                                 # a 28 MB Acta is held raw + base64-encoded while mailing
 
 FUNCTION  = "sendApprovalEmail"
 HANDLER   = "send_approval_email.lambda_handler"
@@ -66,7 +69,8 @@ env_vars = {
 try:
     lambda_client.get_function(FunctionName=FUNCTION)           # exists → update
     print("🔁  Updating code …")
-    lambda_client.update_function_code(FunctionName=FUNCTION, ZipFile=zipped_code)
+    lambda_client.update_function_code(FunctionName=FUNCTION, ZipFile=zipped_code,
+                                       Architectures=[ARCH])   # arch is set with the code
 
     print("⚙️  Waiting for update to finish …")
     lambda_client.get_waiter("function_updated").wait(FunctionName=FUNCTION)
@@ -78,7 +82,7 @@ try:
         Runtime="python3.9",
         Role=ROLE_ARN,
         Timeout=120,
-        MemorySize=256,
+        MemorySize=MEMORY_MB,
         Environment={"Variables": env_vars},
     )
 except lambda_client.exceptions.ResourceNotFoundException:          # create fresh
@@ -89,8 +93,9 @@ except lambda_client.exceptions.ResourceNotFoundException:          # create fre
         Runtime="python3.9",
         Role=ROLE_ARN,
         Code={"ZipFile": zipped_code},
+        Architectures=[ARCH],
         Timeout=120,
-        MemorySize=256,
+        MemorySize=MEMORY_MB,
         Publish=True,
         Environment={"Variables": env_vars},
     )